@@ -8,9 +8,9 @@ import sys
 sys.path.append("/pkg/bin/")
 
 
-import os, subprocess, shutil
+import os, subprocess, shutil, atexit, signal, threading, Queue, errno
 from ztp_helper import ZtpHelpers
-import re, datetime, json, tempfile, time
+import re, datetime, json, tempfile, time, glob, hashlib, pipes
 from time import gmtime, strftime
 
 ROOT_USER = "vagrant"
@@ -27,14 +27,362 @@ SYSLOG_SERVER = "11.11.11.2"
 SYSLOG_PORT = 514
 SYSLOG_LOCAL_FILE = "/root/ztp_python.log"
 CRON_SCRIPT = "cron_action.py"
+STANDBY_SSH_CONTROL_PATH = "/tmp/ztp_ssh_%r@%h:%p"
+STANDBY_BATCH_MARKER = "__ZTP_BATCH__"
+
+# Seconds discard_prefetched() waits for unfinished prefetches, a stalled
+# download must not block the exit of the script
+PREFETCH_DISCARD_TIMEOUT = 30
+
+# Files at least this large are patched block by block on the standby
+DELTA_SYNC_MIN_SIZE = 16 * 1024 * 1024
+DELTA_SYNC_BLOCK_SIZE = 1024 * 1024
+
+# Run on the standby RP by delta_sync_file_to_standby()
+BLOCK_DIGEST_SCRIPT = """
+import sys, hashlib, json
+path, block_size = sys.argv[1], int(sys.argv[2])
+digests = []
+with open(path, 'rb') as fd:
+    while True:
+        data = fd.read(block_size)
+        if not data:
+            break
+        digests.append(hashlib.md5(data).hexdigest())
+print(json.dumps(digests))
+"""
+
+BLOCK_PATCH_SCRIPT = """
+import sys, os, hashlib, json
+path = sys.argv[1]
+header = json.loads(sys.stdin.readline())
+with open(path, 'r+b') as fd:
+    for offset, length in header['blocks']:
+        fd.seek(offset)
+        fd.write(sys.stdin.read(length))
+    fd.truncate(header['size'])
+os.chmod(path, header['mode'])
+hash_md5 = hashlib.md5()
+with open(path, 'rb') as fd:
+    for chunk in iter(lambda: fd.read(1048576), ''):
+        hash_md5.update(chunk)
+print(hash_md5.hexdigest())
+"""
+GPG_KEYS = ["RPM-GPG-KEY-puppet",
+            "RPM-GPG-KEY-puppetlabs",
+            "RPM-GPG-KEY-reductive"]
 
 NODE_TYPE = ["Line Card",
              "LC",
              "Route Processor",
              "Route Switch Processor"]
 
+INSTALL_OP_REGEX = re.compile(r"[Ii]nstall (?:\w+ )?operation (\d+)")
+
+
+class BackgroundTask(threading.Thread):
+
+    def __init__(self, target, *args, **kwargs):
+        """Run a callable in a daemon thread and keep its return value
+           :param target: Callable to run
+           :param args: Positional arguments for target
+           :param kwargs: Keyword arguments for target
+        """
+        super(BackgroundTask, self).__init__()
+        self.daemon = True
+        self.task = target
+        self.task_args = args
+        self.task_kwargs = kwargs
+        self.result = None
+        self.error = None
+
+
+    def run(self):
+        try:
+            self.result = self.task(*self.task_args, **self.task_kwargs)
+        except Exception as e:
+            self.error = e
+
+
+    def wait(self, timeout=None):
+        """Wait for the task to finish
+           :param timeout: Maximum time to wait in seconds, None waits forever
+           :type timeout: int
+           :return: Return value of the callable, None if it raised or is still running
+        """
+        self.join(timeout)
+        return self.result
+
+
+def kill_process_group(pgid, sig=signal.SIGKILL):
+    """Send sig to process group pgid, ignoring a group that already exited
+       :param pgid: Process group ID
+       :param sig: Signal to send
+       :type pgid: int
+       :type sig: int
+    """
+    try:
+        os.killpg(pgid, sig)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+
+
+class InstallOperationTracker(object):
+
+    def __init__(self, ztp, op_id):
+        """Follow a single IOS-XR install operation to completion
+           :param ztp: Object used to issue XR exec commands (ZtpHelpers child)
+           :param op_id: Install operation ID returned by install add/activate/update/commit
+           :type op_id: str
+        """
+        self.ztp = ztp
+        self.op_id = op_id
+        self.log_offset = 0
+        self.state = "in-progress"
+
+
+    @classmethod
+    def from_output(cls, ztp, install_output):
+        """Class Method to create a tracker from the output of an install command
+           :param ztp: Object used to issue XR exec commands
+           :param install_output: Dictionary returned by xrcmd() for the install command
+           :type install_output: dict
+           :return: Tracker for the operation, None if no operation ID was found
+           :rtype: InstallOperationTracker
+        """
+        for line in install_output.get("output") or []:
+            match = INSTALL_OP_REGEX.search(line)
+            if match:
+                return cls(ztp, match.group(1))
+        return None
+
+
+    def in_progress(self):
+        """Check "show install request" for this operation
+           :return: True if the operation is still being executed
+           :rtype: bool
+        """
+        request = self.ztp.xrcmd({"exec_cmd" : "show install request"})
+
+        if request["status"] == "error":
+            # Can't tell, let the install log decide
+            return False
+
+        for line in request["output"]:
+            match = INSTALL_OP_REGEX.search(line)
+            if match and match.group(1) == self.op_id:
+                return True
+
+        return False
+
+
+    def poll(self):
+        """Read only the new lines of "show install log <op_id>" and update the state
+           :return: State of the operation: 'in-progress', 'success' or 'error'
+           :rtype: str
+        """
+        if self.state != "in-progress" or self.in_progress():
+            return self.state
+
+        install_log = self.ztp.xrcmd({"exec_cmd" : "show install log %s" % self.op_id})
+        if install_log["status"] == "error":
+            return self.state
+
+        new_lines = install_log["output"][self.log_offset:]
+        self.log_offset = len(install_log["output"])
+
+        for line in new_lines:
+            if self.ztp.debug:
+                self.ztp.logger.debug("Install operation %s: %s" % (self.op_id, line))
+            if "operation %s" % self.op_id not in line:
+                continue
+            if "finished successfully" in line:
+                self.state = "success"
+            elif any(tag in line for tag in ["aborted", "failed"]):
+                self.state = "error"
+
+        return self.state
+
+
+    def wait(self, duration=300, interval=5):
+        """Wait for the operation to complete
+           :param duration: Maximum time to wait in seconds
+           :param interval: Time between polls in seconds
+           :type duration: int
+           :type interval: int
+           :return: Dictionary with status and an associated message
+                    { 'status': 'error/success', 'output': 'message' }
+           :rtype: dict
+        """
+        t_end = time.time() + duration
+        while time.time() < t_end:
+            state = self.poll()
+            if state == "success":
+                return {"status" : "success", "output" : "Install operation %s finished successfully" % self.op_id}
+            elif state == "error":
+                return {"status" : "error", "output" : "Install operation %s failed" % self.op_id}
+
+            self.ztp.syslogger.info("Waiting for install operation %s to complete" % self.op_id)
+            time.sleep(interval)
+
+        return {"status" : "error", "output" : "Install operation %s timed out" % self.op_id}
+
+
+
 class ZtpFunctions(ZtpHelpers):
 
+    def __init__(self, syslog_file=None, syslog_server=None, syslog_port=None):
+        """__init__ constructor
+           :param syslog_server: IP address of reachable Syslog Server
+           :param syslog_port: Port for the reachable syslog server
+           :param syslog_file: Alternative or addon file for syslog
+           :type syslog_server: str
+           :type syslog_port: int
+           :type syslog_file:str
+        """
+
+        # Snapshot of "show platform vm", refreshed only on node events
+        self.platform_topology = None
+        self.node_states = None
+        # Packages active/committed on all nodes, refreshed after install operations
+        self.installed_packages = None
+        # Peer RP IP of the persistent SSH channel, if open
+        self.standby_channel = None
+        # Set once open_standby_channel() is called, the channel is then
+        # reopened on demand after being torn down
+        self.standby_channel_enabled = False
+        self.standby_channel_lock = threading.Lock()
+        # Cached node name, node list and peer RP IP
+        self.rp_topology = None
+        # Cached internal IP address of every node
+        self.node_ips = {}
+        # Background downloads started by prefetch_files(), keyed by URL
+        self.prefetched = {}
+        super(ZtpFunctions, self).__init__(syslog_file=syslog_file, syslog_server=syslog_server, syslog_port=syslog_port)
+
+
+    def set_vrf(self, vrfname=None, probe_host=None, duration=30):
+        """User defined method in Child Class
+           Overrides set_vrf() of the parent class, which always sleeps
+           30 seconds to let the network namespace and interfaces converge.
+           Returns as soon as the VRF is usable instead (see vrf_converged()).
+
+           :param vrfname: Network namespace name
+                           corresponding to XR VRF
+           :param probe_host: Host (syslog/artifact server) that must be
+                              routable in the VRF before returning.
+                              Defaults to the syslog server, if any.
+           :param duration: Upper bound in seconds to wait for the
+                            network namespace and interfaces to converge.
+           :type vrfname: str
+           :type probe_host: str
+           :type duration: int
+        """
+        if vrfname is not None:
+            self.vrf = vrfname
+        else:
+            self.vrf = "global-vrf"
+
+        if probe_host is None:
+            probe_host = self.syslog_server
+
+        converged = self.wait_for_vrf(probe_host=probe_host, duration=duration)
+
+        # Restart the syslogger service in the new vrf
+        self.syslogger.handlers = []
+        self.setup_syslog()
+
+        if not converged:
+            self.syslogger.info("VRF %s did not converge in %s seconds, continuing" % (self.vrf, duration))
+
+
+
+    def vrf_converged(self, probe_host=None):
+        """User defined method in Child Class
+           Check if the current VRF (network namespace) is usable
+
+           :param probe_host: Host that must have a route in the VRF
+           :type probe_host: str
+           :return: True if the netns file exists, at least one interface
+                    is up with an address and a route to probe_host exists
+           :rtype: bool
+        """
+        netns_path = self.get_netns_path(nsname=self.vrf)
+
+        if not os.path.exists(netns_path):
+            if self.debug:
+                self.logger.debug("Network namespace file %s not present yet" % netns_path)
+            return False
+
+        vrf_exec = "ip netns exec " + str(self.vrf)
+
+        # Interfaces must be administratively and operationally up
+        bash_out = self.run_bash(vrf_exec + " ip -o link show up")
+
+        if bash_out["status"]:
+            return False
+
+        up_interfaces = []
+        for line in bash_out["output"].splitlines():
+            fields = line.split(':')
+            if len(fields) > 2 and "LOWER_UP" in line:
+                intf = fields[1].strip().split('@')[0]
+                if intf != "lo":
+                    up_interfaces.append(intf)
+
+        # ...and at least one of them must carry an address
+        bash_out = self.run_bash(vrf_exec + " ip -o addr show scope global")
+
+        if bash_out["status"]:
+            return False
+
+        addressed_interfaces = [line.split()[1] for line in bash_out["output"].splitlines() if len(line.split()) > 1]
+
+        if not any(intf in addressed_interfaces for intf in up_interfaces):
+            if self.debug:
+                self.logger.debug("No interface up with an address in vrf %s yet" % self.vrf)
+            return False
+
+        if probe_host is not None:
+            bash_out = self.run_bash(vrf_exec + " ip route get " + str(probe_host) + " 2>/dev/null")
+
+            if bash_out["status"]:
+                if self.debug:
+                    self.logger.debug("No route to %s in vrf %s yet" % (probe_host, self.vrf))
+                return False
+
+        return True
+
+
+
+    def wait_for_vrf(self, probe_host=None, duration=30, interval=1):
+        """User defined method in Child Class
+           Wait for the current VRF (network namespace) to converge
+
+           :param probe_host: Host that must have a route in the VRF
+           :param duration: Maximum time to wait in seconds
+           :param interval: Time between probes in seconds
+           :type probe_host: str
+           :type duration: int
+           :type interval: int
+           :return: True if the VRF converged within duration
+           :rtype: bool
+        """
+        t_end = time.time() + duration
+        while True:
+            if self.vrf_converged(probe_host):
+                if self.debug:
+                    self.logger.debug("VRF %s converged" % self.vrf)
+                return True
+
+            if time.time() + interval > t_end:
+                return False
+
+            time.sleep(interval)
+
+
+
     def set_root_user(self):
         """User defined method in Child Class
            Sets the root user for IOS-XR during ZTP
@@ -132,6 +480,11 @@ class ZtpFunctions(ZtpHelpers):
             self.logger.debug("Updated the IOS-XR state of each node")
             self.logger.debug(node_dict)
 
+        # A node changed state, the platform topology snapshot is stale
+        if node_dict != self.node_states:
+            self.node_states = node_dict
+            self.invalidate_platform_topology()
+
         if all(state == "active" for state in node_dict.values()):
             return {"status" : "success", "output": True}
         else:
@@ -184,6 +537,280 @@ class ZtpFunctions(ZtpHelpers):
 
 
 
+    def get_platform_topology(self, refresh=False):
+        """ Fetch the nodes running XR from "show platform vm".
+            The result is kept in memory and only fetched again
+            when refresh is set or after invalidate_platform_topology().
+
+            :param refresh: Force a new "show platform vm"
+            :type refresh: bool
+            :return: Dictionary specifying success/error and the topology
+                     {'status': 'success/error',
+                      'output': {'nodes': ['node names'], 'timestamp': time of snapshot}
+                                in case of success, error message in case of error}
+            :rtype: dict
+        """
+        if self.platform_topology is not None and not refresh:
+            return {"status" : "success", "output" : self.platform_topology}
+
+        show_platform_vm = self.xrcmd({"exec_cmd" : "show platform vm"})
+        if show_platform_vm["status"] == "error":
+            return {"status" : "error", "output" : "Failed to fetch output of show platform vm"}
+
+        # Skip the two header lines
+        nodes = [line.split()[0] for line in show_platform_vm["output"][2:] if line.split()]
+
+        self.platform_topology = {"nodes" : nodes, "timestamp" : time.time()}
+
+        if self.debug:
+            self.logger.debug("Platform topology snapshot: %s" % nodes)
+
+        return {"status" : "success", "output" : self.platform_topology}
+
+
+
+    def invalidate_platform_topology(self):
+        """ Drop the platform topology snapshot, to be called on node events
+        """
+        self.platform_topology = None
+
+
+
+    @classmethod
+    def parse_install_packages(cls, install_output):
+        """ Class Method to parse "show install active/committed" output
+            :param install_output: Lines of output from xrcmd()
+            :type install_output: list
+            :return: Dictionary of node name to the set of packages on the node
+            :rtype: dict
+        """
+        node_packages = {}
+        node = None
+
+        for line in install_output:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == "Node" and len(fields) > 1:
+                node = fields[1]
+                node_packages[node] = set()
+            elif node is not None and not any(tag in line for tag in ["Packages:", "Boot Partition:"]):
+                node_packages[node].add(fields[0])
+
+        return node_packages
+
+
+
+    @classmethod
+    def package_name_from_url(cls, package_url):
+        """ Class Method to derive the XR package name from an RPM URL,
+            e.g. .../ncs5500-k9sec-3.2.0.0-r6225.x86_64.rpm => ncs5500-k9sec-3.2.0.0-r6225
+            :param package_url: Complete URL of the package
+            :type package_url: str
+            :return: XR package name
+            :rtype: str
+        """
+        package_name = os.path.basename(package_url)
+        for suffix in ['.rpm', '.x86_64']:
+            if package_name.endswith(suffix):
+                package_name = package_name[:-len(suffix)]
+        return package_name
+
+
+
+    def get_installed_packages(self, refresh=False):
+        """ Fetch the set of packages active and committed on all nodes.
+            Parsed once from "show install active/committed" and kept until
+            the next install operation or until refresh is set.
+
+            :param refresh: Force new show install commands
+            :type refresh: bool
+            :return: Dictionary specifying success/error and the package sets
+                     {'status': 'success/error',
+                      'output': {'active': set(), 'committed': set(),
+                                 'active_by_node': {node: set()},
+                                 'committed_by_node': {node: set()}} in case of success,
+                                error message in case of error}
+            :rtype: dict
+        """
+        if self.installed_packages is not None and not refresh:
+            return {"status" : "success", "output" : self.installed_packages}
+
+        installed_packages = {}
+
+        for state in ["active", "committed"]:
+            show_install = self.xrcmd({"exec_cmd" : "show install %s" % state})
+
+            if show_install["status"] == "error":
+                return {"status" : "error", "output" : "Failed to fetch output of show install %s" % state}
+
+            node_packages = self.parse_install_packages(show_install["output"])
+            installed_packages[state + "_by_node"] = node_packages
+
+            if node_packages:
+                installed_packages[state] = set.intersection(*node_packages.values())
+            else:
+                installed_packages[state] = set()
+
+        self.installed_packages = installed_packages
+        return {"status" : "success", "output" : self.installed_packages}
+
+
+
+    def invalidate_installed_packages(self):
+        """ Drop the installed package sets, to be called on install operations
+        """
+        self.installed_packages = None
+
+
+
+    def package_active(self, package_name):
+        """ Check if a package is already active on all nodes
+            :param package_name: XR package name (without .x86_64)
+            :type package_name: str
+            :return: True if active on all nodes, False if not or unknown
+            :rtype: bool
+        """
+        installed = self.get_installed_packages()
+
+        if installed["status"] == "error":
+            self.syslogger.info(installed["output"])
+            return False
+
+        return package_name in installed["output"]["active"]
+
+
+
+    def pending_package_urls(self, package_urls):
+        """ Filter out the package URLs already active on all nodes
+            :param package_urls: Complete URLs of the packages
+            :type package_urls: list
+            :return: URLs of the packages that still need to be installed
+            :rtype: list
+        """
+        pending = []
+        for package_url in package_urls:
+            package_name = self.package_name_from_url(package_url)
+            if self.package_active(package_name):
+                self.syslogger.info("Package %s already active on all nodes, skipping installation" % package_name)
+            else:
+                pending.append(package_url)
+        return pending
+
+
+
+    def package_installed(self, package_name, state="active"):
+        """ Legacy check used when the install operation ID is unknown.
+            'active': package count in "show install active" matches the
+                      number of nodes in the platform topology snapshot
+            'inactive': package is listed in "show install inactive"
+
+            :param package_name: Name of the package (without .x86_64)
+            :param state: 'active' or 'inactive'
+            :type package_name: str
+            :type state: str
+            :return: Dictionary specifying success/error and the check result
+                     {'status': 'success/error',
+                      'output':  True/False in case of success,
+                                 error message in case of error}
+            :rtype: dict
+        """
+        if state == "inactive":
+            install_inactive = self.xrcmd({"exec_cmd" : "show install inactive"})
+            if install_inactive["status"] == "error":
+                return {"status" : "error", "output" : "Failed to fetch output of show install inactive"}
+            return {"status" : "success", "output" : package_name in install_inactive["output"][1:]}
+
+        install_active = self.xrcmd({"exec_cmd" : "show install active"})
+        if install_active["status"] == "error":
+            return {"status" : "error", "output" : "Failed to fetch output of show install active"}
+
+        # Since package must get installed on every node, get the count of number of installations for the package
+        install_count = ''.join(install_active["output"]).count(package_name)
+
+        # Fetch the number of active nodes on the chassis, from the snapshot if possible
+        topology = self.get_platform_topology()
+        if topology["status"] == "error":
+            return topology
+
+        active_nodes = len(topology["output"]["nodes"])
+
+        if install_count > active_nodes:
+            # More installs than known nodes, a node came up since the snapshot
+            topology = self.get_platform_topology(refresh=True)
+            if topology["status"] == "error":
+                return topology
+            active_nodes = len(topology["output"]["nodes"])
+
+        # Install count must match the active node count
+        return {"status" : "success", "output" : install_count == active_nodes}
+
+
+
+    def wait_for_install(self, install_output, package_name=None, state="active", duration=300):
+        """ Wait for an install add/activate/update/commit to complete.
+
+            The operation ID in the install command output is followed through
+            "show install request" and "show install log <id>". If no ID can be
+            found, falls back to polling the package state (package_installed()).
+
+            :param install_output: Dictionary returned by xrcmd() for the install command
+            :param package_name: Package (or list of packages) to check in the fallback path
+            :param state: Expected package state in the fallback path, 'active' or 'inactive'
+            :param duration: Maximum time to wait in seconds
+            :type install_output: dict
+            :type package_name: str or list
+            :type state: str
+            :type duration: int
+            :return: Dictionary specifying success/error and an associated message
+                     {'status': 'success/error', 'output': 'success/error message'}
+            :rtype: dict
+        """
+        # Whatever the outcome, the installed package sets are about to change
+        self.invalidate_installed_packages()
+
+        tracker = InstallOperationTracker.from_output(self, install_output)
+
+        if tracker is not None:
+            if self.debug:
+                self.logger.debug("Tracking install operation %s" % tracker.op_id)
+            return tracker.wait(duration)
+
+        if package_name is None:
+            return {"status" : "error", "output" : "No install operation ID found and no package to check"}
+
+        if isinstance(package_name, list):
+            package_names = package_name
+            package_name = ', '.join(package_names)
+        else:
+            package_names = [package_name]
+
+        t_end = time.time() + duration
+        while time.time() < t_end:
+            done = True
+            for name in package_names:
+                check = self.package_installed(name, state)
+
+                if check["status"] == "error":
+                    return {"status" : "error", "output" : "%s -Installation of package %s failed" % (check["output"], name)}
+
+                if not check["output"]:
+                    done = False
+                    break
+
+            if done:
+                return {"status" : "success", "output" : "Package %s is %s" % (package_name, state)}
+
+            # Sleep for 10 seconds before checking again
+            time.sleep(10)
+            if self.debug:
+                self.logger.debug("Waiting for installation of %s package to complete" % package_name)
+            self.syslogger.info("Waiting for installation of %s package to complete" % package_name)
+
+        return {"status" : "error", "output" : "Installation of %s package timed out" % package_name}
+
+
+
 
     def install_xr_update(self, package_url):
         """ Method to install XR packages through initial download followed
@@ -199,6 +826,12 @@ class ZtpFunctions(ZtpHelpers):
             :rtype: dict
         """
 
+        package_name = self.package_name_from_url(package_url)
+
+        if self.package_active(package_name):
+            self.syslogger.info("Package %s already active on all nodes, skipping installation" % package_name)
+            return {"status" : "success", "output" : "Package %s already active" % package_name}
+
         result = {"status": "error", "output" : "Installation of package  failed!"}
 
         # First download the package to the /misc/app_host/scratch folder
@@ -262,72 +895,25 @@ class ZtpFunctions(ZtpHelpers):
                 install_update = self.xrcmd({"exec_cmd" : "install update source  %s %s" % (rpm_location, rpm_name)})
 
                 if install_update["status"] == "success":
-                    t_end = time.time() + 60 * 5
-                    while time.time() < t_end:
-
-                        install_active = self.xrcmd({"exec_cmd" : "show install active"})
-
-                        if install_active["status"] == "error":
-                            result["status"] = "error"
-                            result["output"] = "Failed to fetch output of show install active -Installation of package %s failed" % package_name
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-
-                            return result
-
-                        # Fetch the number of active nodes on the chassis
-                        show_active_nodes = self.xrcmd({"exec_cmd" : "show platform vm"})
-                        if show_active_nodes["status"] == "error":
-                            result["status"] = "error"
-                            result["output"] = "Failed to fetch output of show platform vm -Installation of package %s failed" % package_name
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-
-                            return result
-
-                        active_node_list = show_active_nodes["output"]
-                        active_nodes = len(active_node_list[2:])
-
-                        # Since package must get installed on every node, get the count of number of installations for the package
-                        install_count = ''.join(install_active["output"]).count(package_name)
-                        # Install count must match the active node count
-
-                        if install_count == active_nodes:
-                            if self.debug:
-                                self.logger.debug("Installation of %s package successful" % package_name)
-                            self.syslogger.info("Installation of %s package successsful" % package_name)
-
-                            result["status"] = "success"
-                            result["output"] = "Installation of %s package successful" % package_name
-
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-
-                            break
-                        else:
-                            # Sleep for 10 seconds before checking again
-                            time.sleep(10)
-                            if self.debug:
-                                self.logger.debug("Waiting for installation of %s package to complete" % package_name)
-                            self.syslogger.info("Waiting for installation of %s package to complete" % package_name)
-
-                    if result["status"] == "error":
-                        result["output"] =  "Installation of %s package timed out" % package_name
-                        # Cleanup
-                        try:
-                            os.remove(rpm_path)
-                        except OSError:
-                            result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
+                    install_wait = self.wait_for_install(install_update, package_name=package_name)
+
+                    if install_wait["status"] == "success":
+                        if self.debug:
+                            self.logger.debug("Installation of %s package successful" % package_name)
+                        self.syslogger.info("Installation of %s package successsful" % package_name)
+
+                        result["status"] = "success"
+                        result["output"] = "Installation of %s package successful" % package_name
+                    else:
+                        self.syslogger.info(install_wait["output"])
+                        result["status"] = "error"
+                        result["output"] = "Installation of %s package failed: %s" % (package_name, install_wait["output"])
 
+                    # Cleanup
+                    try:
+                        os.remove(rpm_path)
+                    except OSError:
+                        result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
 
                     return result
                 else:
@@ -357,6 +943,12 @@ class ZtpFunctions(ZtpHelpers):
             :rtype: dict
         """
 
+        package_name = self.package_name_from_url(package_url)
+
+        if self.package_active(package_name):
+            self.syslogger.info("Package %s already active on all nodes, skipping installation" % package_name)
+            return {"status" : "success", "output" : "Package %s already active" % package_name}
+
         result = {"status": "error", "output" : "Installation of package  failed!"}
 
         # First download the package to the /misc/app_host/scratch folder
@@ -420,32 +1012,22 @@ class ZtpFunctions(ZtpHelpers):
                 install_add = self.xrcmd({"exec_cmd" : "install add source %s %s" % (rpm_location, rpm_name)})
 
                 if install_add["status"] == "success":
-                    t_end = time.time() + 60 * 5
-                    while time.time() < t_end: 
-                            
-                        install_inactive = self.xrcmd({"exec_cmd" : "show install inactive"})
-                            
-                        if install_inactive["status"] == "error":
-                            result["status"] = "error"
-                            result["output"] = "Failed to fetch output of show install inactive -Installation of package %s failed" % package_name
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-                        
-                            return result
-                        else:
-                            inactive_packages =  install_inactive["output"][1:]
-                            if package_name in inactive_packages:
-                                self.logger.debug("Install add successful, ready to activate package %s" % (package_name)) 
-                                break 
-                            else:
-                                # Sleep for 10 seconds before checking again
-                                time.sleep(10)
-                                if self.debug:
-                                    self.logger.debug("Waiting for install add of %s package to complete" % package_name)
-                                self.syslogger.info("Waiting for install add of  %s package to complete" % package_name)
+                    install_wait = self.wait_for_install(install_add, package_name=package_name, state="inactive")
+
+                    if install_wait["status"] == "error":
+                        self.syslogger.info(install_wait["output"])
+                        result["status"] = "error"
+                        result["output"] = "Install add of %s package failed: %s" % (package_name, install_wait["output"])
+                        # Cleanup
+                        try:
+                            os.remove(rpm_path)
+                        except OSError:
+                            result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
+
+                        return result
+
+                    if self.debug:
+                        self.logger.debug("Install add successful, ready to activate package %s" % (package_name))
 
                 else:
                     result["status"] = "error"
@@ -465,72 +1047,25 @@ class ZtpFunctions(ZtpHelpers):
                 install_activate = self.xrcmd({"exec_cmd" : "install activate %s" % (package_name)})
                 
                 if install_activate["status"] == "success":
-                    t_end = time.time() + 60 * 5
-                    while time.time() < t_end:
-
-                        install_active = self.xrcmd({"exec_cmd" : "show install active"})
-
-                        if install_active["status"] == "error":
-                            result["status"] = "error"
-                            result["output"] = "Failed to fetch output of show install active -Installation of package %s failed" % package_name
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-
-                            return result
-
-                        # Fetch the number of active nodes on the chassis
-                        show_active_nodes = self.xrcmd({"exec_cmd" : "show platform vm"})
-                        if show_active_nodes["status"] == "error":
-                            result["status"] = "error"
-                            result["output"] = "Failed to fetch output of show platform vm -Installation of package %s failed" % package_name
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-
-                            return result
-
-                        active_node_list = show_active_nodes["output"]
-                        active_nodes = len(active_node_list[2:])
-
-                        # Since package must get installed on every node, get the count of number of installations for the package
-                        install_count = ''.join(install_active["output"]).count(package_name)
-                        # Install count must match the active node count
-
-                        if install_count == active_nodes:
-                            if self.debug:
-                                self.logger.debug("Installation of %s package successful" % package_name)
-                            self.syslogger.info("Installation of %s package successsful" % package_name)
-
-                            result["status"] = "success"
-                            result["output"] = "Installation of %s package successful" % package_name
-
-                            # Cleanup
-                            try:
-                                os.remove(rpm_path)
-                            except OSError:
-                                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
-
-                            break
-                        else:
-                            # Sleep for 10 seconds before checking again
-                            time.sleep(10)
-                            if self.debug:
-                                self.logger.debug("Waiting for installation of %s package to complete" % package_name)
-                            self.syslogger.info("Waiting for installation of %s package to complete" % package_name)
-
-                    if result["status"] == "error":
-                        result["output"] =  "Installation of %s package timed out" % package_name
-                        # Cleanup
-                        try:
-                            os.remove(rpm_path)
-                        except OSError:
-                            result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
+                    install_wait = self.wait_for_install(install_activate, package_name=package_name)
+
+                    if install_wait["status"] == "success":
+                        if self.debug:
+                            self.logger.debug("Installation of %s package successful" % package_name)
+                        self.syslogger.info("Installation of %s package successsful" % package_name)
 
+                        result["status"] = "success"
+                        result["output"] = "Installation of %s package successful" % package_name
+                    else:
+                        self.syslogger.info(install_wait["output"])
+                        result["status"] = "error"
+                        result["output"] = "Installation of %s package failed: %s" % (package_name, install_wait["output"])
+
+                    # Cleanup
+                    try:
+                        os.remove(rpm_path)
+                    except OSError:
+                        result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
 
                     return result
                 else:
@@ -545,292 +1080,1496 @@ class ZtpFunctions(ZtpHelpers):
 
 
 
-    def xr_install_commit(self, duration=60):
+    def cleanup_rpms(self, rpm_paths, result):
+        """ Remove downloaded RPMs, recording a warning in result on failure
+            :param rpm_paths: List of RPM file paths to remove
+            :param result: Result dictionary to update with a warning
+            :type rpm_paths: list
+            :type result: dict
+            :return: Updated result dictionary
+            :rtype: dict
+        """
+        for rpm_path in rpm_paths:
+            try:
+                os.remove(rpm_path)
+            except OSError:
+                result["warning"] = "failed to remove RPM from path: "+str(rpm_path)
+        return result
+
+
+
+    def download_file(self, file_url, destination_folder, md5sum=None, chunk_size=1048576):
         """User defined method in Child Class
-           Issues an "install commit" to make XR packages persistent. 
-           This ensures packages remain active post reloads. 
+           Overrides download_file() of the parent class: if file_url was
+           handed to prefetch_files(), the prefetched copy is moved to
+           destination_folder instead of downloading again. Same parameters
+           and return value as the parent method.
+        """
 
-           Leverages xrcmd() method in ZtpHelpers Class.
-           Should be executed post call to install_xr_package() from ZtpHelpers.
+        prefetched = self.resolve_prefetched(file_url, destination_folder, md5sum=md5sum)
 
-           Returns error if 'duration' is exceeded during "show install committed"
-           check.
+        if prefetched is not None:
+            return prefetched
 
-           :param duration: Duration for which the script must wait for the active 
-                            packages to be committed. 
-           :type duration: int
- 
-           :return: Return a dictionary with status 
-                    { 'status': 'error/success' }
+        return super(ZtpFunctions, self).download_file(file_url, destination_folder,
+                                                       md5sum=md5sum, chunk_size=chunk_size)
+
+
+
+    def prefetch_files(self, file_urls, destination_folder="/misc/app_host/scratch/ztp_prefetch"):
+        """User defined method in Child Class
+           Start downloading files in the background so that later
+           download_file() calls for the same URLs resolve locally.
+           Prefetched files that are never asked for are removed by
+           discard_prefetched(), at the latest when the script exits.
+
+           :param file_urls: List of complete URLs to prefetch
+           :param destination_folder: Scratch folder for the prefetched files
+           :type file_urls: list
+           :type destination_folder: str
+           :return: Dictionary specifying if the prefetch could be started
+                    { 'status' : 'error/success', 'output' : 'message' }
            :rtype: dict
         """
-        install_commit = self.xrcmd({"exec_cmd" : "install commit"})
 
-        if install_commit["status"] == "error":
-            self.syslogger.info("Failed to commit installed packages")
-            return {"status" : "error"} 
-        else:
-            commit_success = False
-            t_end = time.time() + duration
-            while time.time() < t_end:
-                # Check that the install commit was successful
-                commit_state = self.xrcmd({"exec_cmd" : "show install committed"})
+        try:
+            if not os.path.isdir(destination_folder):
+                os.makedirs(destination_folder)
+        except OSError as e:
+            self.syslogger.info("Failed to create prefetch folder %s: %s" % (destination_folder, str(e)))
+            return {"status" : "error", "output" : "Failed to create prefetch folder %s" % destination_folder}
+
+        if not self.prefetched:
+            atexit.register(self.discard_prefetched)
+
+        for file_url in file_urls:
+            if file_url in self.prefetched:
+                continue
+            # The parent method downloads without looking at self.prefetched
+            task = BackgroundTask(super(ZtpFunctions, self).download_file, file_url, destination_folder)
+            task.start()
+            self.prefetched[file_url] = task
+
+        self.syslogger.info("Prefetching %d files to %s" % (len(file_urls), destination_folder))
+        return {"status" : "success", "output" : "Prefetch started for %d files" % len(file_urls)}
+
+
+
+    def resolve_prefetched(self, file_url, destination_folder, md5sum=None):
+        """User defined method in Child Class
+           Hand over a prefetched file, waiting for its download to finish
+
+           :param file_url: Complete URL of the file
+           :param destination_folder: Folder the file should end up in
+           :param md5sum: Optional md5sum the prefetched file must match
+           :type file_url: str
+           :type destination_folder: str
+           :type md5sum: str
+           :return: download_file() style success dictionary, or None if the
+                    file was not prefetched or the prefetch failed
+           :rtype: dict
+        """
+
+        task = self.prefetched.pop(file_url, None)
+
+        if task is None:
+            return None
+
+        prefetch = task.wait()
+
+        if prefetch is None or prefetch["status"] == "error":
+            self.syslogger.info("Prefetch of %s failed, downloading again" % file_url)
+            return None
+
+        filename = prefetch["filename"]
+        prefetch_path = os.path.join(prefetch["folder"], filename)
+
+        try:
+            if md5sum:
+                if md5sum != self.file_md5sum(prefetch_path):
+                    self.syslogger.info("MD5sum of prefetched file %s didn't match, downloading again" % filename)
+                    os.remove(prefetch_path)
+                    return None
+
+            if os.path.realpath(prefetch["folder"]) != os.path.realpath(destination_folder):
+                shutil.move(prefetch_path, os.path.join(destination_folder, filename))
+
+        except (IOError, OSError, shutil.Error) as e:
+            self.syslogger.info("Failed to use prefetched file %s: %s" % (filename, str(e)))
+            return None
+
+        if self.debug:
+            self.logger.debug("Using prefetched file %s for URL:%s" % (filename, file_url))
+        self.syslogger.info("Using prefetched file %s for URL:%s" % (filename, file_url))
+
+        return {"status" : "success", "filename" : filename, "folder" : destination_folder}
+
+
+
+    def discard_prefetched(self, file_urls=None, timeout=PREFETCH_DISCARD_TIMEOUT):
+        """User defined method in Child Class
+           Remove prefetched files that were not used, e.g. packages
+           skipped because they are already active. Downloads still
+           running after timeout seconds are left behind.
+
+           :param file_urls: URLs to discard, None discards every
+                             remaining prefetched file
+           :param timeout: Maximum time in seconds to wait for all the
+                           unfinished downloads together
+           :type file_urls: list
+           :type timeout: int
+        """
+
+        if file_urls is None:
+            file_urls = self.prefetched.keys()
+
+        deadline = time.time() + timeout
+
+        for file_url in file_urls:
+            task = self.prefetched.pop(file_url, None)
+
+            if task is None:
+                continue
+
+            # The download cannot be cancelled, let it finish before removing the file
+            prefetch = task.wait(max(0, deadline - time.time()))
+
+            if task.is_alive():
+                self.syslogger.info("Prefetch of %s still running, leaving it behind" % file_url)
+                continue
+
+            if prefetch is None or prefetch["status"] == "error":
+                continue
+
+            try:
+                os.remove(os.path.join(prefetch["folder"], prefetch["filename"]))
+                self.syslogger.info("Removed unused prefetched file %s" % prefetch["filename"])
+            except OSError as e:
+                self.syslogger.info("Failed to remove prefetched file %s: %s" % (prefetch["filename"], str(e)))
+
+
+
+    def download_files(self, file_urls, destination_folder, md5sums=None, chunk_size=1048576):
+        """User defined method in Child Class
+           Download a list of files concurrently, one thread per URL.
+           download_file() enters the current VRF in every thread on its own
+           (setns is per thread).
+
+           :param file_urls: List of complete URLs to download
+           :param destination_folder: Folder to store the downloaded files
+           :param md5sums: Optional list of md5sums, in the same order as file_urls
+           :param chunk_size: Chunk size to be read in every read() call
+           :type file_urls: list
+           :type destination_folder: str
+           :type md5sums: list
+           :type chunk_size: int
+           :return: Dictionary specifying download success/failure with
+                    the download_file() result of every URL, in order
+                    { 'status' : 'error/success',
+                      'output' : [download_file() result, ...] }
+                    status is error if any of the downloads failed
+           :rtype: dict
+        """
+
+        if md5sums is None:
+            md5sums = [None] * len(file_urls)
+
+        downloads = [BackgroundTask(self.download_file, file_url, destination_folder,
+                                    md5sum=md5sum, chunk_size=chunk_size)
+                     for file_url, md5sum in zip(file_urls, md5sums)]
+
+        for download in downloads:
+            download.start()
+
+        results = []
+        for file_url, download in zip(file_urls, downloads):
+            result = download.wait()
+            if download.error is not None:
+                self.syslogger.info("Exception while downloading %s: %s" % (file_url, str(download.error)))
+            if result is None:
+                result = {"status" : "error"}
+            results.append(result)
+
+        if any(result["status"] == "error" for result in results):
+            return {"status" : "error", "output" : results}
+        else:
+            return {"status" : "success", "output" : results}
+
+
+
+    def download_rpms(self, package_urls, destination_folder="/misc/app_host/scratch"):
+        """ Download a list of RPMs concurrently and query their package names
+
+            :param package_urls: Complete URLs of the packages to be downloaded
+            :param destination_folder: Folder to store the downloaded RPMs
+            :type package_urls: list
+            :type destination_folder: str
+            :return: Dictionary specifying success/error and the downloaded RPMs
+                     {'status': 'success/error',
+                      'output': 'success/error message',
+                      'folder': 'Directory location of downloaded RPMs',
+                      'rpm_names': ['RPM file names'],
+                      'package_names': ['XR package names'],
+                      'rpm_paths': ['Complete RPM paths']}
+                     On error, any downloaded RPM is removed.
+            :rtype: dict
+        """
+
+        result = {"status": "error", "output" : "Download of packages failed!", "folder" : destination_folder,
+                  "rpm_names" : [], "package_names" : [], "rpm_paths" : []}
+
+        downloads = self.download_files(package_urls, destination_folder=destination_folder)
+
+        for download in downloads["output"]:
+            if download["status"] == "success":
+                result["rpm_names"].append(download["filename"])
+                result["rpm_paths"].append(os.path.join(download["folder"], download["filename"]))
+
+        if downloads["status"] == "error":
+            if self.debug:
+                self.logger.debug("Package Download failed, aborting installation process")
+            self.syslogger.info("Package Download failed, aborting installation process")
+
+            return self.cleanup_rpms(result["rpm_paths"], result)
+
+        for rpm_path in result["rpm_paths"]:
+            ## Query the downloaded RPM to figure out the package name
+            cmd = 'rpm -qp ' + str(rpm_path)
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+            out, err = process.communicate()
+
+            package_name = out.rstrip()
+
+            if process.returncode:
+                self.syslogger.info("Failed to get the Package name from downloaded RPM, aborting installation process")
+                result["output"] = "Failed to get the package name from RPM %s" % os.path.basename(rpm_path)
+                return self.cleanup_rpms(result["rpm_paths"], result)
+
+            elif not package_name.endswith('.x86_64'):
+                result["output"] = "Package name %s does not end with x86_64 for  RPM %s" % (package_name, os.path.basename(rpm_path))
+                return self.cleanup_rpms(result["rpm_paths"], result)
+
+            result["package_names"].append(package_name[:-len('.x86_64')])
+
+            verify = self.verify_rpm(rpm_path)
+            if verify["status"] == "error":
+                self.syslogger.info(verify["output"])
+                result["output"] = verify["output"]
+                return self.cleanup_rpms(result["rpm_paths"], result)
+
+        result["status"] = "success"
+        result["output"] = "Downloaded packages %s" % ', '.join(result["package_names"])
+        return result
+
+
+
+    def verify_rpm(self, rpm_path):
+        """ Verify the header and payload digests of a downloaded RPM
+            :param rpm_path: Complete path of the RPM
+            :type rpm_path: str
+            :return: Dictionary specifying success/error and an associated message
+                     {'status': 'success/error', 'output': 'success/error message'}
+            :rtype: dict
+        """
+        cmd = 'rpm -K --nosignature ' + str(rpm_path)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return {"status" : "error", "output" : "RPM %s failed digest check: %s" % (os.path.basename(rpm_path), out.strip())}
+
+        return {"status" : "success", "output" : out.strip()}
+
+
+
+    def install_xr_local(self, rpm_folder, rpm_names, package_names, method="add_activate"):
+        """ Install already downloaded RPMs in a single install operation
+
+            :param rpm_folder: Directory location of the RPMs
+            :param rpm_names: RPM file names
+            :param package_names: XR package names of the RPMs (without .x86_64)
+            :param method: "add_activate" (install add + install activate)
+                           or "update" (install update)
+            :type rpm_folder: str
+            :type rpm_names: list
+            :type package_names: list
+            :type method: str
+            :return: Dictionary specifying success/error and an associated message
+                     {'status': 'success/error', 'output': 'success/error message'}
+            :rtype: dict
+        """
+
+        packages = ', '.join(package_names)
+
+        if method == "update":
+            install_cmd = self.xrcmd({"exec_cmd" : "install update source %s %s" % (rpm_folder, ' '.join(rpm_names))})
+
+            if install_cmd["status"] == "error":
+                return {"status" : "error", "output" : "Failed to execute install update command for packages: %s" % packages}
+
+        else:
+            install_add = self.xrcmd({"exec_cmd" : "install add source %s %s" % (rpm_folder, ' '.join(rpm_names))})
+
+            if install_add["status"] == "error":
+                return {"status" : "error", "output" : "Failed to execute install add command for rpms: %s" % ', '.join(rpm_names)}
+
+            install_wait = self.wait_for_install(install_add, package_name=package_names, state="inactive")
+
+            if install_wait["status"] == "error":
+                self.syslogger.info(install_wait["output"])
+                return {"status" : "error", "output" : "Install add of %s packages failed: %s" % (packages, install_wait["output"])}
+
+            # Now activate all the packages at once
+            install_cmd = self.xrcmd({"exec_cmd" : "install activate %s" % ' '.join(package_names)})
+
+            if install_cmd["status"] == "error":
+                return {"status" : "error", "output" : "Failed to execute install activate command for packages: %s" % packages}
+
+        install_wait = self.wait_for_install(install_cmd, package_name=package_names)
+
+        if install_wait["status"] == "error":
+            self.syslogger.info(install_wait["output"])
+            return {"status" : "error", "output" : "Installation of %s packages failed: %s" % (packages, install_wait["output"])}
+
+        self.syslogger.info("Installation of %s packages successful" % packages)
+        return {"status" : "success", "output" : "Installation of %s packages successful" % packages}
+
+
+
+    def install_xr_update_multi(self, package_urls):
+        """ Method to install a list of XR packages in a single install operation.
+            The packages are downloaded concurrently, then installed with one
+            "install update source" for all RPMs.
+
+            :param package_urls: Complete URLs of the packages to be downloaded
+                                 and installed
+            :type package_urls: list
+            :return: Dictionary specifying success/error and an associated message
+                     {'status': 'success/error',
+                      'output': 'success/error message',
+                      'warning': 'warning if cleanup fails'}
+            :rtype: dict
+        """
+
+        package_urls = self.pending_package_urls(package_urls)
+
+        if not package_urls:
+            return {"status" : "success", "output" : "All packages already active"}
+
+        download = self.download_rpms(package_urls)
+
+        if download["status"] == "error":
+            return {"status" : "error", "output" : download["output"], "warning" : download.get("warning", "")}
+
+        self.syslogger.info("Package Download complete, starting installation process")
+
+        result = self.install_xr_local(download["folder"], download["rpm_names"], download["package_names"], method="update")
+        return self.cleanup_rpms(download["rpm_paths"], result)
+
+
+
+    def install_xr_add_activate_multi(self, package_urls):
+        """ Method to install a list of XR packages in a single transaction.
+            The packages are downloaded concurrently, then added with one
+            "install add source" and activated with one "install activate".
+
+            :param package_urls: Complete URLs of the packages to be downloaded
+                                 and installed
+            :type package_urls: list
+            :return: Dictionary specifying success/error and an associated message
+                     {'status': 'success/error',
+                      'output': 'success/error message',
+                      'warning': 'warning if cleanup fails'}
+            :rtype: dict
+        """
+
+        package_urls = self.pending_package_urls(package_urls)
+
+        if not package_urls:
+            return {"status" : "success", "output" : "All packages already active"}
+
+        download = self.download_rpms(package_urls)
+
+        if download["status"] == "error":
+            return {"status" : "error", "output" : download["output"], "warning" : download.get("warning", "")}
+
+        self.syslogger.info("Package Download complete, starting installation process")
+
+        result = self.install_xr_local(download["folder"], download["rpm_names"], download["package_names"])
+        return self.cleanup_rpms(download["rpm_paths"], result)
+
+
+
+    def install_xr_pipeline(self, package_urls, method="add_activate"):
+        """ Method to install XR packages one install operation at a time,
+            downloading and verifying package N+1 in the background while
+            package N is being installed.
+
+            Use this when the packages must be installed in separate operations,
+            otherwise install_xr_add_activate_multi() is cheaper.
+
+            :param package_urls: Complete URLs of the packages, in install order
+            :param method: "add_activate" or "update", see install_xr_local()
+            :type package_urls: list
+            :type method: str
+            :return: Dictionary specifying success/error and an associated message
+                     {'status': 'success/error',
+                      'output': 'success/error message',
+                      'warning': 'warning if cleanup fails'}
+            :rtype: dict
+        """
+
+        result = {"status" : "success", "output" : "No packages to install"}
+
+        package_urls = self.pending_package_urls(package_urls)
+
+        if not package_urls:
+            return result
+
+        next_download = BackgroundTask(self.download_rpms, [package_urls[0]])
+        next_download.start()
+
+        for index, package_url in enumerate(package_urls):
+            download = next_download.wait()
+            next_download = None
+
+            if download is None:
+                download = {"status" : "error", "output" : "Download of %s failed" % package_url}
+
+            if download["status"] == "error":
+                self.syslogger.info("Package Download failed, aborting installation process")
+                return {"status" : "error", "output" : download["output"], "warning" : download.get("warning", "")}
+
+            # Start fetching the next package before this one gets installed
+            if index + 1 < len(package_urls):
+                next_download = BackgroundTask(self.download_rpms, [package_urls[index + 1]])
+                next_download.start()
+
+            self.syslogger.info("Package Download complete, starting installation of %s" % ', '.join(download["package_names"]))
+
+            result = self.install_xr_local(download["folder"], download["rpm_names"], download["package_names"], method=method)
+            result = self.cleanup_rpms(download["rpm_paths"], result)
+
+            if result["status"] == "error":
+                if next_download is not None:
+                    pending = next_download.wait()
+                    if pending is not None and pending["status"] == "success":
+                        self.cleanup_rpms(pending["rpm_paths"], result)
+                return result
+
+        result["output"] = "Installation of all packages successful"
+        return result
+
+
+
+    def xr_install_commit(self, duration=60):
+        """User defined method in Child Class
+           Issues an "install commit" to make XR packages persistent. 
+           This ensures packages remain active post reloads. 
+
+           Leverages xrcmd() method in ZtpHelpers Class.
+           Should be executed post call to install_xr_package() from ZtpHelpers.
+
+           Returns error if 'duration' is exceeded during "show install committed"
+           check. No install commit is issued if every active package is
+           already committed on every node (e.g. on a re-run of the script).
+
+           :param duration: Duration for which the script must wait for the active 
+                            packages to be committed. 
+           :type duration: int
+ 
+           :return: Return a dictionary with status 
+                    { 'status': 'error/success' }
+           :rtype: dict
+        """
+        installed = self.get_installed_packages()
+
+        if installed["status"] == "success":
+            if installed["output"]["committed_by_node"] == installed["output"]["active_by_node"]:
+                self.syslogger.info("All active packages already committed, skipping install commit")
+                return {"status" : "success"}
+
+        install_commit = self.xrcmd({"exec_cmd" : "install commit"})
+
+        if install_commit["status"] == "error":
+            self.syslogger.info("Failed to commit installed packages")
+            return {"status" : "error"} 
+        else:
+            self.invalidate_installed_packages()
+            tracker = InstallOperationTracker.from_output(self, install_commit)
+
+            # The commit usually completes within a couple of seconds,
+            # start polling fast and back off up to 10 seconds
+            interval = 1
+            t_end = time.time() + duration
+            while time.time() < t_end:
+                if tracker is not None:
+                    state = tracker.poll()
+                    if state == "error":
+                        self.syslogger.info("Install commit operation %s failed" % tracker.op_id)
+                        return {"status" : "error"}
+                    operation_done = (state == "success")
+                else:
+                    operation_done = True
+
+                if operation_done:
+                    # Check that the install commit was successful
+                    installed = self.get_installed_packages(refresh=True)
+
+                    if installed["status"] == "error":
+                        self.syslogger.info(installed["output"])
+                        return {"status" : "error"}
+
+                    # Every node must have the same set of packages committed as active
+                    if installed["output"]["committed_by_node"] == installed["output"]["active_by_node"]:
+                        self.syslogger.info("Install commit successful!")
+                        return {"status" : "success"}
+
+                self.syslogger.info("Install commit not done yet")
+                time.sleep(interval)
+                interval = min(interval * 2, 10)
+
+            self.syslogger.info("Install commit unsuccessful!")
+            return {"status" : "error"} 
+
+
+
+    def get_replace_config(self, url=None, caption=None):
+        """User defined method in Child Class
+           Downloads IOS-XR config from specified 'url'
+           and replaces config to the box. 
+
+           Leverages xrreplace() method in ZtpHelpers Class.
+
+           :param url: Complete url for config to be downloaded 
+           :type url: str 
+           :type caption: str 
+
+           :return: Return a dictionary with status and output
+                    { 'status': 'error/success', 'output': 'output from xrreplace/custom error' }
+           :rtype: dict
+        """
+
+        result = {"status" : "error", "output" : "", "warning" : ""}
+
+        # Download configuration file
+        if url is not None:
+            download = self.download_file(url, destination_folder="/root/")
+        else:
+            self.syslogger.info("URL not specified")
+            result["output"] = "URL not specified"
+            return result
+
+        if download["status"] == "error":
+            self.syslogger.info("Config Download failed")
+            result["output"] = "Config Download failed"
+            return result
+ 
+            
+        file_path = os.path.join(result["folder"], result["filename"])
+    
+        if caption is None:
+            caption = "Configuration Applied through ZTP python"
+
+        # Apply Configuration file
+        config_replace = self.xrreplace(result)
+
+        if config_replace["status"] == "error":
+            self.syslogger.info("Failed to apply config: Config Apply result = %s" % config_replace["output"])
+            result["output"] = config_replace["output"]
+            return result
+
+
+        # Download and config application successful, mark for success
+
+        result["status"] = "success"
+        try:
+            os.remove(file_path)
+        except OSError:
+            self.syslogger.info("Failed to remove downloaded config file")
+            result["output"] = config_replace["output"]
+            result["warning"] = "Failed to remove downloaded config file @ %s" % file_path
+        return result
+
+
+    def run_bash(self, cmd=None, timeout=None):
+        """User defined method in Child Class
+           Wrapper method for basic subprocess.Popen to execute 
+           bash commands on IOS-XR.
+
+           :param cmd: bash command to be executed in XR linux shell. 
+           :param timeout: Optional time in seconds after which the
+                           command and its children are killed
+           :type cmd: str 
+           :type timeout: int
+           
+           :return: Return a dictionary with status and output
+                    { 'status': '0 or non-zero', 
+                      'output': 'output from bash cmd' }
+           :rtype: dict
+        """
+        ## In XR the default shell is bash, hence the name
+        if cmd is not None:
+            if timeout is None:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+                out, err = process.communicate()
+            else:
+                # Own process group, so that the whole command can be killed
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True, preexec_fn=os.setsid)
+                timer = threading.Timer(timeout, kill_process_group, [process.pid])
+                timer.start()
+                try:
+                    out, err = process.communicate()
+                finally:
+                    timer.cancel()
+        else:
+            self.syslogger.info("No bash command provided")
+
+
+        status = process.returncode
+
+        return {"status" : status, "output" : out}
+
+
+
+    def get_rp_topology(self, refresh=False):
+        """User defined method in Child Class
+           IOS-XR internally use a private IP address space
+           to reference linecards and RPs.
+
+           This method uses XR internal binaries to fetch the name
+           of this node, the list of all nodes and the internal IP
+           address of the Peer RP in an HA setup. The result is cached
+           until invalidate_rp_topology() is called (connection failure
+           to the peer, RP switchover) or refresh is set.
+
+           :param refresh: Force a new lookup
+           :type refresh: bool
+
+           :return: Return a dictionary with status and the topology
+                    { 'status': 'error/success',
+                      'my_node_name': 'Name of this node',
+                      'node_list': ['Names of all nodes'],
+                      'peer_rp_ip': 'IP address of Peer RP, empty if no standby' }
+           :rtype: dict
+        """
+        if self.rp_topology is not None and not refresh:
+            return self.rp_topology
+
+        cmd = "ip netns exec xrnns /pkg/bin/node_list_generation -f MY"
+        bash_out = self.run_bash(cmd)
+        if not bash_out["status"]:
+            my_name = bash_out["output"]
+        else:
+            self.syslogger.info("Failed to get My Node Name")
+            return {"status" : "error", "peer_rp_ip" : ""}
+
+        cmd = "ip netns exec xrnns /pkg/bin/node_conversion -N " + str(my_name)
+        bash_out = self.run_bash(cmd)
+        if not bash_out["status"]:
+            my_node_name = bash_out["output"].replace('\n', '')
+        else:
+            self.syslogger.info("Failed to convert My Node Name")
+            return {"status" : "error", "peer_rp_ip" : ""}
+
+
+        cmd = "ip netns exec xrnns /pkg/bin/node_list_generation -f ALL"
+        bash_out = self.run_bash(cmd)
+
+        if not bash_out["status"]:
+            node_name_list = bash_out["output"].split()
+        else:
+            self.syslogger.info("Failed to get Node Name List")
+            return {"status" : "error", "peer_rp_ip" : ""}
+
+        peer_rp_ip = ""
+
+        for node in node_name_list:
+            if "RP" in node:
+                if my_node_name != node:
+                    cmd="ip netns exec xrnns /pkg/bin/admin_nodeip_from_nodename -n " + str(node)
+                    bash_out = self.run_bash(cmd)
+       
+                    if not bash_out["status"]:
+                        peer_rp_ip = bash_out["output"].strip()
+                        break
+                    else:
+                        self.syslogger.info("Failed to get Peer RP IP")
+                        return {"status" : "error", "peer_rp_ip" : ""}
+
+        self.rp_topology = {"status" : "success",
+                            "my_node_name" : my_node_name,
+                            "node_list" : node_name_list,
+                            "peer_rp_ip" : peer_rp_ip}
+        return self.rp_topology
+
+
+
+    def invalidate_rp_topology(self):
+        """User defined method in Child Class
+           Drop the cached RP topology, e.g. after a connection failure
+           to the peer RP or an RP switchover. Any persistent channel to
+           the old peer is closed as well.
+        """
+        self.rp_topology = None
+        self.node_ips = {}
+        self.close_standby_channel()
+
+
+
+    def get_peer_rp_ip(self, refresh=False):
+        """User defined method in Child Class
+           Fetch the internal IP address of the Peer RP in an HA setup.
+           Leverages the cached get_rp_topology() method above.
+
+           :param refresh: Force a new topology lookup
+           :type refresh: bool
+
+           :return: Return a dictionary with status and the peer RP IP 
+                    { 'status': 'error/success', 
+                      'peer_rp_ip': 'IP address of Peer RP' }
+           :rtype: dict
+        """
+        topology = self.get_rp_topology(refresh)
+
+        if topology["status"] == "error":
+            return {"status" : "error", "peer_rp_ip" : ""}
+
+        if not topology["peer_rp_ip"]:
+            self.syslogger.info("There is no standby RP!")            
+            return {"status" : "error", "peer_rp_ip" : ""}
+
+        return {"status" : "success", "peer_rp_ip" : topology["peer_rp_ip"]}
+ 
+
+
+    def standby_ssh_options(self):
+        """User defined method in Child Class
+           Options that make ssh/scp reuse the persistent channel
+           to the standby RP. A channel torn down by invalidate_rp_topology()
+           is reopened here if open_standby_channel() was used before.
+
+           :return: ssh/scp options, empty string if no channel is open
+           :rtype: str
+        """
+        if self.standby_channel is None and self.standby_channel_enabled:
+            # Standby commands may run from several threads, open only one master
+            with self.standby_channel_lock:
+                if self.standby_channel is None:
+                    self.open_standby_channel()
+
+        if self.standby_channel is None:
+            return ""
+        return "-o ControlMaster=no -o ControlPath=" + STANDBY_SSH_CONTROL_PATH + " "
+
+
+
+    def open_standby_channel(self):
+        """User defined method in Child Class
+           Open a persistent (ControlMaster) SSH connection to the
+           standby RP. scp_to_standby() and execute_cmd_on_standby()
+           reuse it instead of doing a new handshake every time.
+           The channel is torn down at exit.
+
+           :return: Return a dictionary with status
+                    { 'status': 'error/success' }
+           :rtype: dict
+        """
+        if self.standby_channel is not None:
+            return {"status" : "success"}
+
+        if not self.standby_channel_enabled:
+            self.standby_channel_enabled = True
+            atexit.register(self.close_standby_channel)
+
+        standby_ip = self.get_peer_rp_ip()
+
+        if standby_ip["status"] == "error":
+            return {"status" : "error"}
+
+        peer_rp_ip = str(standby_ip["peer_rp_ip"]).strip()
+
+        # The backgrounded master must not hold on to run_bash()'s stdout pipe
+        cmd = ("ip netns exec xrnns ssh -fN -o ConnectTimeout=10 -o ControlMaster=yes -o ControlPersist=yes " +
+               "-o ControlPath=" + STANDBY_SSH_CONTROL_PATH + " root@" + peer_rp_ip +
+               " </dev/null >/dev/null 2>&1")
+        bash_out = self.run_bash(cmd)
+
+        if bash_out["status"]:
+            self.syslogger.info("Failed to open persistent SSH channel to standby")
+            return {"status" : "error"}
+
+        self.standby_channel = peer_rp_ip
+        self.syslogger.info("Opened persistent SSH channel to standby RP " + peer_rp_ip)
+        return {"status" : "success"}
+
+
+
+    def close_standby_channel(self):
+        """User defined method in Child Class
+           Tear down the persistent SSH connection to the standby RP, if open.
+        """
+        if self.standby_channel is None:
+            return
+
+        cmd = ("ip netns exec xrnns ssh -O exit -o ControlPath=" + STANDBY_SSH_CONTROL_PATH +
+               " root@" + self.standby_channel + " 2>/dev/null")
+        self.run_bash(cmd)
+        self.standby_channel = None
+
+
+
+    def scp_to_standby(self, src_file_path=None, dest_file_path=None):
+        """User defined method in Child Class
+           Used to scp files from active to standby RP.
+           
+           leverages the get_peer_rp_ip() method above.
+           Useful to keep active and standby in sync with files 
+           in the linux environment.
+
+           :param src_file_path: Source file location on Active RP 
+           :param dest_file_path: Destination file location on Standby RP 
+           :type src_file_path: str 
+           :type dest_file_path: str 
+
+           :return: Return a dictionary with status based on scp result. 
+                    { 'status': 'error/success' }
+           :rtype: dict
+        """
+
+        if any([src_file_path, dest_file_path]) is None:
+            self.syslogger.info("Incorrect File path\(s\)") 
+            return {"status" : "error"}
+
+        peer_rp_ip = None
+
+        # Retry once if the peer RP changed since it was cached
+        for attempt in range(2):
+            standby_ip = self.get_peer_rp_ip()
+
+            if standby_ip["status"] == "error" or standby_ip["peer_rp_ip"] == peer_rp_ip:
+                return {"status" : "error"}
+
+            peer_rp_ip = standby_ip["peer_rp_ip"]
+
+            self.syslogger.info("Transferring file "+str(src_file_path)+" from Active RP to standby location: " +str(dest_file_path))
+            cmd = "ip netns exec xrnns scp "+self.standby_ssh_options()+str(src_file_path)+ " root@" + str(peer_rp_ip) + ":" + str(dest_file_path)
+            bash_out = self.run_bash(cmd)
+
+            if not bash_out["status"]:
+                return {"status" : "success"}
+
+            self.syslogger.info("Failed to transfer file to standby")
+            self.invalidate_rp_topology()
+
+        return {"status" : "error"}
+
+
+            
+    def file_md5sum(self, file_path):
+        """User defined method in Child Class
+           md5sum of a local file, read in chunks.
+
+           :param file_path: Path of the file
+           :type file_path: str
+           :return: hex digest of the file, None if it can't be read
+           :rtype: str
+        """
+        hash_md5 = hashlib.md5()
+        try:
+            with open(file_path, "rb") as fd:
+                for chunk in self.read_in_chunks(fd, 1048576):
+                    hash_md5.update(chunk)
+        except IOError:
+            return None
+        return hash_md5.hexdigest()
+
+
+
+    def standby_md5sums(self, peer_rp_ip, file_paths, transfer=False):
+        """User defined method in Child Class
+           Fetch the md5sum of files on the standby RP in a single ssh call.
+
+           :param peer_rp_ip: IP address of the standby RP
+           :param file_paths: Absolute file paths on the standby
+           :param transfer: Ship the files from the active RP in a tar
+                            stream (modes preserved) before computing md5sums
+           :type peer_rp_ip: str
+           :type file_paths: list
+           :type transfer: bool
+           :return: Dictionary of file path to md5sum, for the files present on the standby
+           :rtype: dict
+        """
+        quoted_paths = ' '.join(pipes.quote(file_path) for file_path in file_paths)
+        remote_cmd = "md5sum " + quoted_paths + " 2>/dev/null"
+
+        if transfer:
+            remote_cmd = "tar -xpf - -C / ; " + remote_cmd
+
+        cmd = ("ip netns exec xrnns ssh " + self.standby_ssh_options() + "root@" + str(peer_rp_ip) +
+               " " + pipes.quote(remote_cmd))
+
+        if transfer:
+            cmd = ("tar -cpf - -C / " + ' '.join(pipes.quote(file_path.lstrip('/')) for file_path in file_paths) +
+                   " | " + cmd)
+
+        bash_out = self.run_bash(cmd)
+
+        remote_md5 = {}
+        for line in (bash_out["output"] or "").splitlines():
+            fields = line.split(None, 1)
+            if len(fields) == 2:
+                remote_md5[fields[1].strip()] = fields[0]
+
+        return remote_md5
+
+
+
+    def delta_sync_file_to_standby(self, file_path, peer_rp_ip, block_size=DELTA_SYNC_BLOCK_SIZE):
+        """User defined method in Child Class
+           rsync-style transfer of a file that already exists on the
+           standby RP: block digests are fetched from the standby and only
+           the blocks that differ are sent and patched in place.
+
+           :param file_path: Absolute file path, same on active and standby
+           :param peer_rp_ip: IP address of the standby RP
+           :param block_size: Size of the compared blocks in bytes
+           :type file_path: str
+           :type peer_rp_ip: str
+           :type block_size: int
+           :return: Return a dictionary with status and the md5sum on the standby
+                    { 'status': 'error/success', 'output': 'md5sum of the standby file' }
+           :rtype: dict
+        """
+        ssh_cmd = ["ip", "netns", "exec", "xrnns", "ssh"] + self.standby_ssh_options().split() + ["root@" + str(peer_rp_ip)]
+
+        process = subprocess.Popen(ssh_cmd + ["python -c " + pipes.quote(BLOCK_DIGEST_SCRIPT) + " " +
+                                              pipes.quote(file_path) + " " + str(block_size)],
+                                   stdout=subprocess.PIPE)
+        out, err = process.communicate()
+
+        try:
+            remote_digests = json.loads(out)
+        except ValueError:
+            return {"status" : "error", "output" : ""}
+
+        changed_blocks = []
+        size = os.path.getsize(file_path)
+
+        with open(file_path, "rb") as fd:
+            index = 0
+            for chunk in self.read_in_chunks(fd, block_size):
+                if index >= len(remote_digests) or hashlib.md5(chunk).hexdigest() != remote_digests[index]:
+                    changed_blocks.append([index * block_size, len(chunk)])
+                index += 1
+
+        self.syslogger.info("Delta sync of "+str(file_path)+" to standby: "+str(len(changed_blocks))+" changed blocks")
+
+        header = {"size" : size, "mode" : os.stat(file_path).st_mode & 0o7777, "blocks" : changed_blocks}
+
+        process = subprocess.Popen(ssh_cmd + ["python -c " + pipes.quote(BLOCK_PATCH_SCRIPT) + " " + pipes.quote(file_path)],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            process.stdin.write(json.dumps(header) + "\n")
+            with open(file_path, "rb") as fd:
+                for offset, length in changed_blocks:
+                    fd.seek(offset)
+                    process.stdin.write(fd.read(length))
+            process.stdin.close()
+        except (IOError, OSError) as e:
+            self.syslogger.info("Delta sync of "+str(file_path)+" to standby failed: "+str(e))
+
+        out = process.stdout.read()
+        process.wait()
+
+        if process.returncode:
+            return {"status" : "error", "output" : ""}
+
+        return {"status" : "success", "output" : out.strip()}
+
+
+
+    def sync_files_to_standby(self, paths=None, delta=True):
+        """User defined method in Child Class
+           Used to ship many files from active to standby RP in a single
+           tar-over-ssh stream. Files land at the same absolute path on the
+           standby, with their modes preserved. Shell globs are expanded
+           on the active RP.
+
+           With delta set, md5sums are first compared against the standby and
+           only files that differ are shipped. Large files that already exist
+           on the standby are patched block by block (delta_sync_file_to_standby()).
+
+           Each file is then checked on the standby by comparing its md5sum
+           with the local copy.
+
+           :param paths: List of file paths on Active RP
+           :param delta: Skip unchanged files and patch large ones
+           :type paths: list
+           :type delta: bool
+
+           :return: Return a dictionary with the overall status and the
+                    result of every file
+                    { 'status': 'error/success',
+                      'output': { 'file path': 'error/success' } }
+           :rtype: dict
+        """
+
+        if not paths:
+            self.syslogger.info("No files specified to sync to standby")
+            return {"status" : "error", "output" : {}}
+
+        results = {}
+        local_md5 = {}
+
+        for path in paths:
+            matches = glob.glob(path)
+            if not matches:
+                self.syslogger.info("File "+str(path)+" not found, can't sync it to standby")
+                results[path] = "error"
+            for match in matches:
+                file_path = os.path.abspath(match)
+                local_md5[file_path] = self.file_md5sum(file_path)
+                if local_md5[file_path] is None:
+                    results[file_path] = "error"
+                    del local_md5[file_path]
+
+        if not local_md5:
+            return {"status" : "error", "output" : results}
+
+        standby_ip = self.get_peer_rp_ip()
+
+        if standby_ip["status"] == "error":
+            for file_path in local_md5:
+                results[file_path] = "error"
+            return {"status" : "error", "output" : results}
+
+        peer_rp_ip = standby_ip["peer_rp_ip"]
+        file_paths = sorted(local_md5)
+        remote_md5 = {}
+
+        if delta:
+            remote_md5 = self.standby_md5sums(peer_rp_ip, file_paths)
+
+            for file_path in file_paths:
+                if remote_md5.get(file_path) != local_md5[file_path] and file_path in remote_md5 \
+                   and os.path.getsize(file_path) >= DELTA_SYNC_MIN_SIZE:
+                    delta_sync = self.delta_sync_file_to_standby(file_path, peer_rp_ip)
+                    if delta_sync["status"] == "success":
+                        remote_md5[file_path] = delta_sync["output"]
+
+        transfer_paths = [file_path for file_path in file_paths if remote_md5.get(file_path) != local_md5[file_path]]
+
+        if transfer_paths:
+            self.syslogger.info("Syncing files "+', '.join(transfer_paths)+" from Active RP to standby")
+
+            # Extract on the standby, then report the md5sum of every file
+            remote_md5.update(self.standby_md5sums(peer_rp_ip, transfer_paths, transfer=True))
+
+        if not remote_md5:
+            # Nothing reported back, the connection itself probably failed
+            self.invalidate_rp_topology()
+
+        for file_path in file_paths:
+            if remote_md5.get(file_path) == local_md5[file_path]:
+                results[file_path] = "success"
+            else:
+                self.syslogger.info("Failed to sync file "+str(file_path)+" to standby")
+                results[file_path] = "error"
+
+        if all(result == "success" for result in results.values()):
+            return {"status" : "success", "output" : results}
+        else:
+            return {"status" : "error", "output" : results}
+
+
+
+    def execute_cmd_on_standby(self, cmd=None): 
+        """User defined method in Child Class
+           Used to execute bash commands on the standby RP
+           and fetch the output over SSH.
+
+           Leverages get_peer_rp_ip() and run_bash() methods above.
+
+           :param cmd: bash command to execute on Standby RP 
+           :type cmd: str 
+
+           :return: Return a dictionary with status and output
+                    { 'status': 'error/success', 
+                      'output': 'empty/output from bash cmd on standby' }
+           :rtype: dict
+        """
+
+        if cmd is None:
+            self.syslogger.info("No command specified")
+            return {"status" : "error", "output" : ""}
+        else:
+            with tempfile.NamedTemporaryFile(delete=True) as f:
+                f.write("#!/bin/bash\n%s" % cmd)
+                f.flush()
+                f.seek(0,0)
+                peer_rp_ip = None
+
+                # Retry once if the peer RP changed since it was cached
+                for attempt in range(2):
+                    standby_ip = self.get_peer_rp_ip()
+                    if standby_ip["status"] == "error" or standby_ip["peer_rp_ip"] == peer_rp_ip:
+                        return {"status" : "error", "output" : ""}
+
+                    peer_rp_ip = standby_ip["peer_rp_ip"]
+                    standby_cmd = "ip netns exec xrnns ssh "+self.standby_ssh_options()+"root@"+str(peer_rp_ip)+ " " + "\"$(< "+str(f.name)+")\"" 
+                   
+                    bash_out = self.run_bash(standby_cmd)
+
+                    if not bash_out["status"]:
+                        return {"status" : "success", "output": bash_out["output"]}
+
+                    self.syslogger.info("Failed to execute command on standby")
+
+                    # ssh exits with 255 when the connection itself failed
+                    if bash_out["status"] != 255:
+                        return {"status" : "error", "output" : ""}
+
+                    self.invalidate_rp_topology()
 
-                if commit_state["status"] == "error":
-                    self.syslogger.info("show install committed failed to execute ")
-                    return {"status" : "error"} 
+                return {"status" : "error", "output" : ""}
 
-                active_state = self.xrcmd({"exec_cmd" : "show install active"})
-                if active_state["status"] == "error":
-                    self.syslogger.info("show install active failed to execute ")
-                    return {"status" : "error"} 
 
-                # Excluding the date (first line) and lines saying Active vs Committed,
-                #  the rest of the commit and active state outputs must match
 
-                commit_output = commit_state["output"][1:]
-                commit_compare = [x for x in commit_output if "Committed" not in x]
+    def execute_cmds_on_standby(self, cmds=None, stop_on_error=False):
+        """User defined method in Child Class
+           Batch variant of execute_cmd_on_standby(): runs an ordered list
+           of bash commands on the standby RP in a single SSH session.
+
+           :param cmds: bash commands to execute on Standby RP, in order
+           :param stop_on_error: Skip the remaining commands after the first failure
+           :type cmds: list
+           :type stop_on_error: bool
+
+           :return: Return a dictionary with the overall status and the result
+                    of every command that was executed
+                    { 'status': 'error/success',
+                      'output': [{ 'cmd': '', 'status': 'error/success',
+                                   'exit_code': int, 'output': '',
+                                   'duration': seconds }] }
+           :rtype: dict
+        """
 
-                active_output = active_state["output"][1:]
-                active_compare = [x for x in active_output if "Active" not in x]
+        if not cmds:
+            self.syslogger.info("No command specified")
+            return {"status" : "error", "output" : []}
+
+        script = ["#!/bin/bash"]
+        for index, cmd in enumerate(cmds):
+            script += ['echo "%s %d"' % (STANDBY_BATCH_MARKER, index),
+                       '__ztp_start=$(date +%s%N)',
+                       # stdin of the batch is the script itself, keep commands off it
+                       'bash -c ' + pipes.quote(cmd) + ' </dev/null 2>&1',
+                       '__ztp_rc=$?',
+                       '__ztp_end=$(date +%s%N)',
+                       # Leading newline keeps the marker on its own line
+                       'printf "\\n%s %d %%d %%d\\n" $__ztp_rc $(( (__ztp_end - __ztp_start) / 1000000 ))' % (STANDBY_BATCH_MARKER, index)]
+            if stop_on_error:
+                script.append('[ $__ztp_rc -eq 0 ] || exit $__ztp_rc')
 
-                if ''.join(commit_compare) == ''.join(active_compare):
-                    self.syslogger.info("Install commit successful!")
-                    return {"status" : "success"}
-                else:
-                    self.syslogger.info("Install commit not done yet")
-                    time.sleep(10)
+        with tempfile.NamedTemporaryFile(delete=True) as f:
+            f.write('\n'.join(script) + '\n')
+            f.flush()
 
-            self.syslogger.info("Install commit unsuccessful!")
-            return {"status" : "error"} 
+            peer_rp_ip = None
 
+            # Retry once if the peer RP changed since it was cached
+            for attempt in range(2):
+                standby_ip = self.get_peer_rp_ip()
+                if standby_ip["status"] == "error" or standby_ip["peer_rp_ip"] == peer_rp_ip:
+                    return {"status" : "error", "output" : []}
 
+                peer_rp_ip = standby_ip["peer_rp_ip"]
+                standby_cmd = ("ip netns exec xrnns ssh "+self.standby_ssh_options()+"root@"+str(peer_rp_ip)+
+                               " bash -s < "+str(f.name))
+                bash_out = self.run_bash(standby_cmd)
 
-    def get_replace_config(self, url=None, caption=None):
-        """User defined method in Child Class
-           Downloads IOS-XR config from specified 'url'
-           and replaces config to the box. 
+                # ssh exits with 255 when the connection itself failed
+                if bash_out["status"] != 255 or STANDBY_BATCH_MARKER in (bash_out["output"] or ""):
+                    break
 
-           Leverages xrreplace() method in ZtpHelpers Class.
+                self.syslogger.info("Failed to connect to standby")
+                self.invalidate_rp_topology()
+            else:
+                return {"status" : "error", "output" : []}
+
+        results = []
+        current = None
+        for line in (bash_out["output"] or "").split('\n'):
+            fields = line.split()
+            if fields[:1] == [STANDBY_BATCH_MARKER] and len(fields) == 2:
+                current = {"cmd" : cmds[int(fields[1])], "output" : []}
+            elif fields[:1] == [STANDBY_BATCH_MARKER] and len(fields) == 4 and current is not None:
+                exit_code = int(fields[2])
+                results.append({"cmd" : current["cmd"],
+                                "status" : "error" if exit_code else "success",
+                                "exit_code" : exit_code,
+                                # Joining the lines also drops the newline added before the end marker
+                                "output" : '\n'.join(current["output"]),
+                                "duration" : int(fields[3]) / 1000.0})
+                current = None
+            elif current is not None:
+                current["output"].append(line)
+
+        if len(results) == len(cmds) and all(result["status"] == "success" for result in results):
+            return {"status" : "success", "output" : results}
+        else:
+            self.syslogger.info("Failed to execute commands on standby")
+            return {"status" : "error", "output" : results}
 
-           :param url: Complete url for config to be downloaded 
-           :type url: str 
-           :type caption: str 
 
-           :return: Return a dictionary with status and output
-                    { 'status': 'error/success', 'output': 'output from xrreplace/custom error' }
+
+    def run_on_active_and_standby(self, cmds=None, standby=True, standby_cmds=None):
+        """User defined method in Child Class
+           Run the same bash command(s) on the active RP (run_bash())
+           and on the standby RP (execute_cmd_on_standby()) concurrently,
+           then join the results. On each RP the commands run in order
+           and stop at the first failure.
+
+           :param cmds: bash command or list of bash commands
+           :param standby: Flag to indicate if the commands should run on the standby RP too
+           :param standby_cmds: Command(s) to run on the standby RP instead of cmds
+           :type cmds: str or list
+           :type standby: bool
+           :type standby_cmds: str or list
+
+           :return: Return a dictionary with the overall status and the
+                    output of every command on each RP
+                    { 'status': 'error/success',
+                      'active': [{ 'cmd': '', 'status': 'error/success', 'output': '' }],
+                      'standby': [{ 'cmd': '', 'status': 'error/success', 'output': '' }] }
            :rtype: dict
         """
 
-        result = {"status" : "error", "output" : "", "warning" : ""}
+        if cmds is None:
+            self.syslogger.info("No command specified")
+            return {"status" : "error", "active" : [], "standby" : []}
 
-        # Download configuration file
-        if url is not None:
-            download = self.download_file(url, destination_folder="/root/")
-        else:
-            self.syslogger.info("URL not specified")
-            result["output"] = "URL not specified"
-            return result
+        if not isinstance(cmds, list):
+            cmds = [cmds]
 
-        if download["status"] == "error":
-            self.syslogger.info("Config Download failed")
-            result["output"] = "Config Download failed"
-            return result
- 
-            
-        file_path = os.path.join(result["folder"], result["filename"])
-    
-        if caption is None:
-            caption = "Configuration Applied through ZTP python"
+        if standby_cmds is None:
+            standby_cmds = cmds
+        elif not isinstance(standby_cmds, list):
+            standby_cmds = [standby_cmds]
 
-        # Apply Configuration file
-        config_replace = self.xrreplace(result)
+        def run_active():
+            results = []
+            for cmd in cmds:
+                bash_out = self.run_bash(cmd)
+                status = "error" if bash_out["status"] else "success"
+                results.append({"cmd" : cmd, "status" : status, "output" : bash_out["output"]})
+                if status == "error":
+                    self.syslogger.info("Failed to execute command on active: " + str(cmd))
+                    break
+            return results
 
-        if config_replace["status"] == "error":
-            self.syslogger.info("Failed to apply config: Config Apply result = %s" % config_replace["output"])
-            result["output"] = config_replace["output"]
-            return result
+        def run_standby():
+            # All the standby commands go through a single SSH session
+            return self.execute_cmds_on_standby(standby_cmds, stop_on_error=True)["output"]
 
+        standby_task = None
+        if standby:
+            standby_task = BackgroundTask(run_standby)
+            standby_task.start()
 
-        # Download and config application successful, mark for success
+        active_results = run_active()
+        standby_results = (standby_task.wait() or []) if standby_task is not None else []
 
-        result["status"] = "success"
-        try:
-            os.remove(file_path)
-        except OSError:
-            self.syslogger.info("Failed to remove downloaded config file")
-            result["output"] = config_replace["output"]
-            result["warning"] = "Failed to remove downloaded config file @ %s" % file_path
-        return result
+        failed = (len(active_results) != len(cmds) or
+                  any(result["status"] == "error" for result in active_results) or
+                  (standby and (len(standby_results) != len(standby_cmds) or
+                                any(result["status"] == "error" for result in standby_results))))
+
+        return {"status" : "error" if failed else "success",
+                "active" : active_results,
+                "standby" : standby_results}
 
 
-    def run_bash(self, cmd=None):
+
+    def get_node_ip(self, node):
         """User defined method in Child Class
-           Wrapper method for basic subprocess.Popen to execute 
-           bash commands on IOS-XR.
+           Internal IP address of a node (linecard or RP), cached
+           alongside the RP topology.
 
-           :param cmd: bash command to be executed in XR linux shell. 
-           :type cmd: str 
-           
-           :return: Return a dictionary with status and output
-                    { 'status': '0 or non-zero', 
-                      'output': 'output from bash cmd' }
+           :param node: Node name as listed by node_list_generation
+           :type node: str
+           :return: Return a dictionary with status and the node IP
+                    { 'status': 'error/success', 'node_ip': 'IP address of node' }
            :rtype: dict
         """
-        ## In XR the default shell is bash, hence the name
-        if cmd is not None:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-            out, err = process.communicate()
-        else:
-            self.syslogger.info("No bash command provided")
+        if node not in self.node_ips:
+            cmd = "ip netns exec xrnns /pkg/bin/admin_nodeip_from_nodename -n " + str(node)
+            bash_out = self.run_bash(cmd)
 
+            if bash_out["status"]:
+                self.syslogger.info("Failed to get IP of node " + str(node))
+                return {"status" : "error", "node_ip" : ""}
 
-        status = process.returncode
+            self.node_ips[node] = bash_out["output"].strip()
 
-        return {"status" : status, "output" : out}
+        return {"status" : "success", "node_ip" : self.node_ips[node]}
 
 
 
-    def get_peer_rp_ip(self):
+    def fan_out(self, task, nodes, max_workers=4):
         """User defined method in Child Class
-           IOS-XR internally use a private IP address space
-           to reference linecards and RPs.
- 
-           This method uses XR internal binaries to fetch the
-           internal IP address of the Peer RP in an HA setup.
+           Run task(node) for every node on a pool of at most
+           max_workers threads.
+
+           :param task: Callable taking a node name, returning a result dictionary
+           :param nodes: Node names
+           :param max_workers: Maximum number of nodes worked on at the same time
+           :type nodes: list
+           :type max_workers: int
+           :return: Dictionary of node name to the result of task(node)
+           :rtype: dict
+        """
+        results = {}
+        node_queue = Queue.Queue()
+        for node in nodes:
+            node_queue.put(node)
 
-           :param url: Complete url for config to be downloaded 
-           :param caption: Any reason to be specified when applying 
-                           config. Will show up in the output of:
-                          "show configuration commit list detail" 
-           :type url: str 
-           :type caption: str 
+        def worker():
+            while True:
+                try:
+                    node = node_queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results[node] = task(node)
+                except Exception as e:
+                    results[node] = {"status" : "error", "output" : str(e)}
 
+        workers = [BackgroundTask(worker) for index in range(min(max_workers, len(nodes)))]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.wait()
 
-           :return: Return a dictionary with status and the peer RP IP 
-                    { 'status': 'error/success', 
-                      'peer_rp_ip': 'IP address of Peer RP' }
+        return results
+
+
+
+    def run_on_all_nodes(self, cmd=None, max_workers=4, timeout=60, include_self=True):
+        """User defined method in Child Class
+           Run a bash command on every node (linecards and RPs) in parallel.
+           The local node runs it through run_bash(), the others over ssh
+           through xrnns.
+
+           :param cmd: bash command to execute on every node
+           :param max_workers: Maximum number of nodes running the command at the same time
+           :param timeout: Time in seconds after which the command is killed on a node
+           :param include_self: Run the command on this node as well
+           :type cmd: str
+           :type max_workers: int
+           :type timeout: int
+           :type include_self: bool
+
+           :return: Return a dictionary with the overall status and the
+                    result of every node
+                    { 'status': 'error/success',
+                      'output': { 'node': { 'status': 'error/success',
+                                            'exit_code': int,
+                                            'output': 'output from bash cmd',
+                                            'duration': seconds } } }
            :rtype: dict
         """
-        cmd = "ip netns exec xrnns /pkg/bin/node_list_generation -f MY"
-        bash_out = self.run_bash(cmd)
-        if not bash_out["status"]:
-            my_name = bash_out["output"]
-        else:
-            self.syslogger.info("Failed to get My Node Name")
-            return {"status" : "error", "peer_rp_ip" : ""}
-
-        cmd = "ip netns exec xrnns /pkg/bin/node_conversion -N " + str(my_name)
-        bash_out = self.run_bash(cmd)
-        if not bash_out["status"]:
-            my_node_name = bash_out["output"].replace('\n', '')
-        else:
-            self.syslogger.info("Failed to convert My Node Name")
-            return {"status" : "error", "peer_rp_ip" : ""}
+        if cmd is None:
+            self.syslogger.info("No command specified")
+            return {"status" : "error", "output" : {}}
 
+        return self.run_per_node(lambda node_ip: ("ip netns exec xrnns ssh -o ConnectTimeout=10 " +
+                                                  "root@" + node_ip + " " + pipes.quote(cmd)),
+                                 local_cmd=cmd if include_self else None,
+                                 max_workers=max_workers, timeout=timeout)
 
-        cmd = "ip netns exec xrnns /pkg/bin/node_list_generation -f ALL"
-        bash_out = self.run_bash(cmd)
 
-        if not bash_out["status"]:
-            node_name_list = bash_out["output"].split()
-        else:
-            self.syslogger.info("Failed to get Node Name List")
-            return {"status" : "error", "peer_rp_ip" : ""}
 
-        
-        for node in node_name_list:
-            if "RP" in node:
-                if my_node_name != node:
-                    cmd="ip netns exec xrnns /pkg/bin/admin_nodeip_from_nodename -n " + str(node)
-                    bash_out = self.run_bash(cmd)
-       
-                    if not bash_out["status"]:
-                        return {"status" : "success", "peer_rp_ip" : bash_out["output"]}
-                    else:
-                        self.syslogger.info("Failed to get Peer RP IP")
-                        return {"status" : "error", "peer_rp_ip" : ""}
+    def push_file_to_all_nodes(self, src_file_path=None, dest_file_path=None, max_workers=4, timeout=300):
+        """User defined method in Child Class
+           Copy a file from this node to every other node (linecards and RPs)
+           in parallel.
+
+           :param src_file_path: Source file location on this node
+           :param dest_file_path: Destination file location on the other nodes,
+                                  defaults to src_file_path
+           :param max_workers: Maximum number of transfers at the same time
+           :param timeout: Time in seconds after which a transfer is killed
+           :type src_file_path: str
+           :type dest_file_path: str
+           :type max_workers: int
+           :type timeout: int
+
+           :return: Same structure as run_on_all_nodes()
+           :rtype: dict
+        """
+        if src_file_path is None:
+            self.syslogger.info("Incorrect File path\(s\)")
+            return {"status" : "error", "output" : {}}
 
-        self.syslogger.info("There is no standby RP!")            
-        return {"status" : "error", "peer_rp_ip" : ""}
- 
+        if dest_file_path is None:
+            dest_file_path = src_file_path
 
+        return self.run_per_node(lambda node_ip: ("ip netns exec xrnns scp -p -o ConnectTimeout=10 " +
+                                                  pipes.quote(src_file_path) + " root@" + node_ip + ":" +
+                                                  pipes.quote(dest_file_path)),
+                                 local_cmd=None, max_workers=max_workers, timeout=timeout)
 
-    def scp_to_standby(self, src_file_path=None, dest_file_path=None):
-        """User defined method in Child Class
-           Used to scp files from active to standby RP.
-           
-           leverages the get_peer_rp_ip() method above.
-           Useful to keep active and standby in sync with files 
-           in the linux environment.
 
-           :param src_file_path: Source file location on Active RP 
-           :param dest_file_path: Destination file location on Standby RP 
-           :type src_file_path: str 
-           :type dest_file_path: str 
 
-           :return: Return a dictionary with status based on scp result. 
-                    { 'status': 'error/success' }
+    def run_per_node(self, remote_cmd, local_cmd=None, max_workers=4, timeout=60):
+        """User defined method in Child Class
+           Shared executor behind run_on_all_nodes() and push_file_to_all_nodes().
+
+           :param remote_cmd: Callable taking a node IP, returning the bash
+                              command that acts on that node
+           :param local_cmd: bash command for this node, None to skip this node
+           :param max_workers: Maximum number of nodes worked on at the same time
+           :param timeout: Time in seconds after which the command is killed on a node
+           :return: See run_on_all_nodes()
            :rtype: dict
         """
+        topology = self.get_rp_topology()
 
-        if any([src_file_path, dest_file_path]) is None:
-            self.syslogger.info("Incorrect File path\(s\)") 
-            return {"status" : "error"}
-
-        standby_ip = self.get_peer_rp_ip()
+        if topology["status"] == "error":
+            return {"status" : "error", "output" : {}}
 
-        if standby_ip["status"] == "error":
-            return {"status" : "error"}
-        else:
-            self.syslogger.info("Transferring file "+str(src_file_path)+" from Active RP to standby location: " +str(dest_file_path))
-            cmd = "ip netns exec xrnns scp "+str(src_file_path)+ " root@" + str(standby_ip["peer_rp_ip"]) + ":" + str(dest_file_path)
-            bash_out = self.run_bash(cmd)
+        nodes = [node for node in topology["node_list"]
+                 if node != topology["my_node_name"] or local_cmd is not None]
 
-            if bash_out["status"]:
-                self.syslogger.info("Failed to transfer file to standby")
-                return {"status" : "error"}
+        def run_on_node(node):
+            if node == topology["my_node_name"]:
+                cmd = local_cmd
             else:
-                return {"status" : "success"}
-
+                node_ip = self.get_node_ip(node)
+                if node_ip["status"] == "error":
+                    return {"status" : "error", "exit_code" : None, "output" : "Failed to get node IP", "duration" : 0}
+                cmd = remote_cmd(node_ip["node_ip"])
 
-            
-    def execute_cmd_on_standby(self, cmd=None): 
-        """User defined method in Child Class
-           Used to execute bash commands on the standby RP
-           and fetch the output over SSH.
+            start = time.time()
+            bash_out = self.run_bash(cmd, timeout=timeout)
+            duration = time.time() - start
 
-           Leverages get_peer_rp_ip() and run_bash() methods above.
+            if bash_out["status"] == -signal.SIGKILL:
+                self.syslogger.info("Command timed out on node " + str(node))
 
-           :param cmd: bash command to execute on Standby RP 
-           :type cmd: str 
+            return {"status" : "error" if bash_out["status"] else "success",
+                    "exit_code" : bash_out["status"],
+                    "output" : bash_out["output"],
+                    "duration" : duration}
 
-           :return: Return a dictionary with status and output
-                    { 'status': 'error/success', 
-                      'output': 'empty/output from bash cmd on standby' }
-           :rtype: dict
-        """
+        results = self.fan_out(run_on_node, nodes, max_workers=max_workers)
 
-        if cmd is None:
-            self.syslogger.info("No command specified")
-            return {"status" : "error", "output" : ""}
+        if results and all(result["status"] == "success" for result in results.values()):
+            return {"status" : "success", "output" : results}
         else:
-            with tempfile.NamedTemporaryFile(delete=True) as f:
-                f.write("#!/bin/bash\n%s" % cmd)
-                f.flush()
-                f.seek(0,0)
-                standby_ip = self.get_peer_rp_ip()
-                if standby_ip["status"] == "error":
-                    return {"status" : "error", "output" : ""}
-                standby_cmd = "ip netns exec xrnns ssh root@"+str(standby_ip["peer_rp_ip"])+ " " + "\"$(< "+str(f.name)+")\"" 
-               
-                bash_out = self.run_bash(standby_cmd)
-
-                if bash_out["status"]:
-                    self.syslogger.info("Failed to execute command on standby")
-                    return {"status" : "error", "output" : ""}
-                else:
-                    return {"status" : "success", "output": bash_out["output"]}
+            return {"status" : "error", "output" : results}
 
 
 
@@ -952,17 +2691,23 @@ class ZtpFunctions(ZtpHelpers):
                 try:
                     os.remove(ztp_cronfile)
                     self.syslogger.info("Successfully removed cronfile "+ ztp_cronfile)
-
-                    if self.execute_cmd_on_standby("rm "+ ztp_cronfile)["status"] == "success":
-                        self.syslogger.info("Successfully removed cronfile"+ztp_cronfile+" on standby")
-                    else:
-                        self.syslogger.info("Failed to remove cronfile"+ztp_cronfile+" on standby")
-                        return {"status" : "error"}
                 except Exception as e:
                     self.syslogger.info("Failed to remove cronfile "+ ztp_cronfile)
                     self.syslogger.info("Error is "+ str(e))
                     return {"status" : "error"}
 
+            if ztp_cronfiles:
+                # Remove all the cronfiles on standby in a single round trip
+                standby_rm = self.execute_cmds_on_standby(["rm "+ ztp_cronfile for ztp_cronfile in ztp_cronfiles])
+
+                for result in standby_rm["output"]:
+                    self.syslogger.info(("Successfully ran " if result["status"] == "success" else "Failed to run ")+
+                                        result["cmd"]+" on standby")
+
+                if standby_rm["status"] == "error":
+                    self.syslogger.info("Failed to remove cronfiles "+', '.join(ztp_cronfiles)+" on standby")
+                    return {"status" : "error"}
+
         return {"status" : "success"}                        
 
 
@@ -1024,6 +2769,12 @@ if __name__ == "__main__":
     # Set the root user first. Always preferable so that the user can manually gain access to the router in case ZTP script aborts.
     ztp_script.set_root_user()
 
+    # Fetch every artifact needed later in the run while we wait for the nodes
+    ztp_script.prefetch_files([SERVER_URL_PACKAGES + K9SEC_PACKAGE,
+                               SERVER_URL_PACKAGES + MGBL_PACKAGE,
+                               SERVER_URL_CONFIGS + CONFIG_FILE,
+                               SERVER_URL_SCRIPTS + CRON_SCRIPT] +
+                              [SERVER_URL_PACKAGES + gpg_key for gpg_key in GPG_KEYS])
 
     # Let's wait for inventory manager to be updated before checking if nodes are ready
     time.sleep(600)
@@ -1051,23 +2802,33 @@ if __name__ == "__main__":
         ztp_script.syslogger.info("Unable to determine Standby Status on system. Error:"+ check_ha["error"])
         sys.exit(1)
 
+    if standby_rp_present:
+        # All standby operations below share one SSH connection
+        if ztp_script.open_standby_channel()["status"] == "error":
+            ztp_script.syslogger.info("Continuing with a new SSH connection per standby operation")
+
 
     # Use the parent class helper methods
 
+    # Both packages are prefetched, so mgbl downloads while k9sec installs
     ztp_script.syslogger.info("###### Installing k9sec package ######")
-    install_result =  ztp_script.install_xr_update(SERVER_URL_PACKAGES + K9SEC_PACKAGE)
+    install_result = ztp_script.install_xr_update_multi([SERVER_URL_PACKAGES + K9SEC_PACKAGE])
 
     if install_result["status"] == "error":
-        ztp_script.syslogger.info("Failed to install k9sec package")
+        ztp_script.syslogger.info("Failed to install k9sec package: " + str(install_result["output"]))
         sys.exit(1)
 
     ztp_script.syslogger.info("###### install mgbl package ######")
-    install_result = ztp_script.install_xr_add_activate(SERVER_URL_PACKAGES + MGBL_PACKAGE)
+    install_result = ztp_script.install_xr_add_activate_multi([SERVER_URL_PACKAGES + MGBL_PACKAGE])
 
     if install_result["status"] == "error":
-        ztp_script.syslogger.info("Failed to install mgbl package")
+        ztp_script.syslogger.info("Failed to install mgbl package: " + str(install_result["output"]))
         sys.exit(1)
 
+    # Packages skipped as already active leave their prefetched RPMs unused
+    ztp_script.discard_prefetched([SERVER_URL_PACKAGES + K9SEC_PACKAGE,
+                                   SERVER_URL_PACKAGES + MGBL_PACKAGE])
+
 
     # To make sure xr packages remain active post reloads, commit them
     ztp_script.syslogger.info("Committing the installed packages")
@@ -1145,15 +2906,6 @@ if __name__ == "__main__":
         resolver_fh.write('\n'.join(setup_resolver))
 
 
-    if standby_rp_present:
-        # Now sync the resolver file to standby
-        standby_scp = ztp_script.scp_to_standby(src_file_path=resolver, dest_file_path=resolver)
-    
-        if standby_scp["status"] == "error":
-            ztp_script.syslogger.info("Failed to transfer resolver file to standby")
-            sys.exit(1)
-
-
     # Set up access to yum repository for Puppet. User could do a direct download and install via rpm as well
 
     ztp_script.syslogger.info("Setting up yum repo for puppet RPM install on Active and Standby RP")
@@ -1172,59 +2924,39 @@ if __name__ == "__main__":
         puppet_yum_conf_fh.write('\n'.join(setup_yum_repo))
 
 
-    if standby_rp_present:
-        # Now sync the puppet yum config file to standby
-        standby_scp = ztp_script.scp_to_standby(src_file_path=puppet_yum_conf, dest_file_path=puppet_yum_conf)
-
-        if standby_scp["status"] == "error":
-            ztp_script.syslogger.info("Failed to transfer puppet yum config file to standby")
-            sys.exit(1)
-
-
     # Download GPG KEYS for puppet install
 
     ztp_script.syslogger.info("Dowloading GPG keys for puppet install to active and standby RP(if present)") 
 
+    gpg_key_paths = []
 
-    gpg_keys_list = ["RPM-GPG-KEY-puppet",
-                     "RPM-GPG-KEY-puppetlabs",
-                     "RPM-GPG-KEY-reductive"]
-
-
-    for gpg_key in gpg_keys_list:
+    for gpg_key in GPG_KEYS:
         download_gpg = ztp_script.download_file(SERVER_URL_PACKAGES+str(gpg_key), destination_folder="/root/")
 
         if download_gpg["status"] == "error":
             ztp_script.syslogger.info("Failed to download "+str(gpg_key))
             sys.exit(1)
 
-        filename = download_gpg["filename"]
-        folder = download_gpg["folder"]
-        filepath = os.path.join(folder, filename)
+        gpg_key_paths.append(os.path.join(download_gpg["folder"], download_gpg["filename"]))
 
-        if standby_rp_present:
-            # Transfer gpg key to standby as well
-            standby_scp = ztp_script.scp_to_standby(src_file_path=filepath, dest_file_path=filepath)
 
-            if standby_scp["status"] == "error":
-                ztp_script.syslogger.info("Failed to transfer gpg key to standby")
-                sys.exit(1)
+    if standby_rp_present:
+        # Now sync the resolver file, the puppet yum config file and the gpg keys to standby in one go
+        standby_sync = ztp_script.sync_files_to_standby([resolver, puppet_yum_conf] + gpg_key_paths)
 
-        # Import the GPG Key on Active and Standby (if present)
-        ztp_script.syslogger.info("Importing GPG key:"+str(gpg_key)+"on active")
-        rpm_import = ztp_script.run_bash("rpm --import /root/"+str(gpg_key))
- 
-        if rpm_import["status"] == "error":
-            ztp_script.syslogger.info("Failed to import GPG Key:"+str(gpg_key)+"on active")
+        if standby_sync["status"] == "error":
+            ztp_script.syslogger.info("Failed to transfer resolver, yum config and gpg keys to standby: " + json.dumps(standby_sync["output"]))
             sys.exit(1)
 
 
-        if standby_rp_present:
-            ztp_script.syslogger.info("Importing GPG key:"+str(gpg_key)+"on standby")
-            standby_rpm_import = ztp_script.execute_cmd_on_standby("rpm --import /root/"+str(gpg_key))
-            if standby_rpm_import["status"] == "error":
-                ztp_script.syslogger.info("Failed to import GPG Key:"+str(gpg_key)+"on standby")
-                sys.exit(1)
+    # Import the GPG Keys on Active and Standby (if present) at the same time
+    ztp_script.syslogger.info("Importing GPG keys:"+', '.join(GPG_KEYS)+" on active and standby RP(if present)")
+    rpm_import = ztp_script.run_on_active_and_standby(["rpm --import /root/"+str(gpg_key) for gpg_key in GPG_KEYS],
+                                                      standby=standby_rp_present)
+
+    if rpm_import["status"] == "error":
+        ztp_script.syslogger.info("Failed to import GPG Keys: "+json.dumps(rpm_import))
+        sys.exit(1)
 
 
 
@@ -1234,8 +2966,7 @@ if __name__ == "__main__":
 
     puppet_install_cmdlist = ["/usr/bin/yum clean all > /dev/null",
                              str(vrf_exec) + " /usr/bin/yum update > /dev/null",
-                             str(vrf_exec) + " /usr/bin/yum install -y --downloadonly --downloaddir=/root/ puppet > /dev/null",
-                             str(vrf_exec) + " /usr/bin/yum install -y /root/puppet*.rpm"]
+                             str(vrf_exec) + " /usr/bin/yum install -y --downloadonly --downloaddir=/root/ puppet > /dev/null"]
 
 
     for cmd in puppet_install_cmdlist:
@@ -1246,18 +2977,34 @@ if __name__ == "__main__":
             #sys.exit(1)
 
 
+    ztp_script.syslogger.info("Downloading and setting up python Cronjob to start daemons in event of switchover")
+    download_cron = ztp_script.download_file(SERVER_URL_SCRIPTS + CRON_SCRIPT, destination_folder="/root/")
+
+    if download_cron["status"] == "error":
+        ztp_script.syslogger.info("Unable to download cron job!")
+        sys.exit(1)
+
+
+    filename = download_cron["filename"]
+    folder = download_cron["folder"]
+    filepath = os.path.join(folder, filename)
+
+
     if standby_rp_present:
-        # Transfer puppet RPM to standby to install
-        standby_scp = ztp_script.scp_to_standby(src_file_path='/root/puppet*.rpm', dest_file_path='/root/')
+        # Transfer puppet RPM and the cronjob script to standby
+        standby_sync = ztp_script.sync_files_to_standby(['/root/puppet*.rpm', filepath])
 
-        if standby_scp["status"] == "error":
-            ztp_script.syslogger.info("Failed to transfer puppet RPM to standby")
+        if standby_sync["status"] == "error":
+            ztp_script.syslogger.info("Failed to transfer puppet RPM and cronjob script to standby: " + json.dumps(standby_sync["output"]))
             sys.exit(1)
 
-        standby_rpm_install = ztp_script.execute_cmd_on_standby("/usr/bin/rpm -ivh /root/puppet*.rpm > /dev/null")
-        if standby_rpm_install["status"] == "error":
-            ztp_script.syslogger.info("Failed to install Puppet RPM on standby")
-            #sys.exit(1)
+    # Install the downloaded puppet RPM on Active and Standby (if present) at the same time
+    puppet_rpm_install = ztp_script.run_on_active_and_standby(str(vrf_exec) + " /usr/bin/yum install -y /root/puppet*.rpm",
+                                                              standby=standby_rp_present,
+                                                              standby_cmds="/usr/bin/rpm -ivh /root/puppet*.rpm > /dev/null")
+    if puppet_rpm_install["status"] == "error":
+        ztp_script.syslogger.info("Failed to install Puppet RPM: "+json.dumps(puppet_rpm_install))
+        #sys.exit(1)
 
 
 
@@ -1277,37 +3024,15 @@ if __name__ == "__main__":
 
     if standby_rp_present:
         # Now sync the puppet config file to standby
-        standby_scp = ztp_script.scp_to_standby(src_file_path=puppet_conf, dest_file_path=puppet_conf)
-
-        if standby_scp["status"] == "error":
-            ztp_script.syslogger.info("Failed to transfer puppet yum config file to standby")
-            sys.exit(1)
-
-
-    ztp_script.syslogger.info("Downloading and setting up python Cronjob to start daemons in event of switchover")
-    download_cron = ztp_script.download_file(SERVER_URL_SCRIPTS + CRON_SCRIPT, destination_folder="/root/")
-
-    if download_cron["status"] == "error":
-        ztp_script.syslogger.info("Unable to download cron job!")
-        sys.exit(1)
-
-
-    filename = download_cron["filename"]
-    folder = download_cron["folder"]
-    filepath = os.path.join(folder, filename)
-
-
-    if standby_rp_present:
-        # Transfer cronjob script to standby as well
-        standby_scp = ztp_script.scp_to_standby(src_file_path=filepath, dest_file_path=filepath)
+        standby_sync = ztp_script.sync_files_to_standby([puppet_conf])
 
-        if standby_scp["status"] == "error":
-            ztp_script.syslogger.info("Failed to transfer cronjob script to standby")
+        if standby_sync["status"] == "error":
+            ztp_script.syslogger.info("Failed to transfer puppet config file to standby")
             sys.exit(1)
 
 
     #Create the cron cmd 
-    croncmd = "* * * * * root PATH=/sbin:/usr/sbin:/bin:/usr/bin:${PATH};/usr/bin/python " + str(filepath)
+    croncmd = "* * * * * root PATH=/sbin:/usr/sbin:/bin:/usr/bin:${PATH};/usr/bin/python " + str(filepath) + " --daemon"
 
     # Set up cronjob on active and standby(if present)
 
@@ -1,8 +1,452 @@
 #!/usr/bin/env python
 
-import sys,os, json, subprocess
+import sys,os, json, subprocess, time, argparse, random, tempfile, threading, hashlib
+import fcntl, errno, signal
+import httplib, socket, urllib, shlex, re, pipes
 sys.path.append('/pkg/bin')
-from ztp_helper import ZtpHelpers
+from ztp_helper import ZtpHelpers, CLONE_NEWNET
+from urllib2 import Request, urlopen, URLError, HTTPError
+
+# Single instance lock, its mtime is refreshed by a heartbeat thread
+CRON_ACTION_LOCKFILE = "/var/run/ztp_cron_action.lock"
+# A lock whose heartbeat is older than this (seconds) belongs to a hung process
+CRON_LOCK_STALE_AGE = 600
+# Period in seconds of the heartbeat thread
+CRON_HEARTBEAT_PERIOD = 60
+# The heartbeat stops once a single tick has been running for this many
+# seconds, so that a hung tick still goes stale and gets broken
+CRON_TICK_MAX_AGE = 3600
+# Period in seconds of the cron entry running this script
+CRON_TICK_PERIOD = 60
+CRON_MANIFEST_FOLDER = "/misc/app_host/scratch"
+
+# Schedule used for methods that do not specify their own
+DEFAULT_METHOD_INTERVAL = 60
+DEFAULT_METHOD_JITTER = 0
+DEFAULT_METHOD_TIMEOUT = None
+
+# Persistent state shared across cron runs, kept on persistent storage
+CRON_STATE_FILE = "/misc/app_host/ztp_cron_state.json"
+# Maximum age in seconds of a cached is_active_rp result
+ACTIVE_RP_STATE_TTL = 300
+
+# Maximum number of cron methods executed at the same time
+CRON_MAX_WORKERS = 4
+
+# Docker daemon socket used when DOCKER_HOST does not point to a unix socket
+DOCKER_SOCKET = "/misc/app_host/docker.sock"
+# Highest Engine API version used, lowered to the version of an older daemon
+DOCKER_API_VERSION = "1.24"
+# Block size used when streaming an image into docker import
+DOCKER_STREAM_CHUNK = 1048576
+# docker CLI used on the standby RP over ssh
+STANDBY_DOCKER = "docker -H unix://" + DOCKER_SOCKET
+
+# Run on the standby RP to record an entry in its Cron Action state file,
+# using the same lock and atomic rename as CronAction.save_state()
+STANDBY_STATE_UPDATE_SCRIPT = """
+import sys, os, json, fcntl, tempfile
+state_file, section, key, value = sys.argv[1], sys.argv[2], sys.argv[3], json.loads(sys.argv[4])
+with open(state_file + ".lock", "a") as lock_fd:
+    fcntl.flock(lock_fd.fileno(), fcntl.LOCK_EX)
+    try:
+        with open(state_file) as fd:
+            state = json.load(fd)
+    except (IOError, ValueError):
+        state = {}
+    state.setdefault(section, {})[key] = value
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(state_file))
+    with os.fdopen(fd, "w") as tmp_fd:
+        json.dump(state, tmp_fd)
+        tmp_fd.flush()
+        os.fsync(tmp_fd.fileno())
+    os.rename(tmp_path, state_file)
+"""
+
+# Seconds to wait before resubscribing to docker events after the stream broke
+DOCKER_EVENTS_RETRY = 5
+
+# Exponential backoff (seconds) between restarts of a supervised container,
+# reset once the container stayed up for RESTART_RESET_AFTER seconds
+RESTART_BACKOFF_BASE = 1
+RESTART_BACKOFF_MAX = 300
+RESTART_RESET_AFTER = 600
+
+class BackgroundTask(threading.Thread):
+
+    def __init__(self, target, *args, **kwargs):
+        '''Run a callable in a daemon thread and keep its return value
+           :param target: Callable to run
+           :param args: Positional arguments for target
+           :param kwargs: Keyword arguments for target
+        '''
+        super(BackgroundTask, self).__init__()
+        self.daemon = True
+        self.task = target
+        self.task_args = args
+        self.task_kwargs = kwargs
+        self.result = None
+        self.error = None
+
+
+    def run(self):
+        try:
+            self.result = self.task(*self.task_args, **self.task_kwargs)
+        except Exception as e:
+            self.error = e
+
+
+    def wait(self, timeout=None):
+        '''Wait for the task to finish
+           :param timeout: Maximum time to wait in seconds, None waits forever
+           :type timeout: int
+           :return: Return value of the callable, None if it raised or is still running
+        '''
+        self.join(timeout)
+        return self.result
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    '''HTTPConnection over a unix domain socket'''
+
+    def __init__(self, socket_path, timeout=60):
+        httplib.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class HashingReader(object):
+    '''File-like wrapper that hashes everything read through it'''
+
+    def __init__(self, source, hash_type="md5"):
+        self.source = source
+        self.hash = hashlib.new(hash_type)
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.source.read(size)
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class DockerClient(object):
+    '''Minimal Docker Engine API client talking to the daemon over its unix socket.
+       Every method returns a dictionary { 'status' : 'error/success', 'output' : ... }
+    '''
+
+    def __init__(self, socket_path=None, timeout=60):
+        if socket_path is None:
+            docker_host = os.environ.get("DOCKER_HOST", "")
+            if docker_host.startswith("unix://"):
+                socket_path = docker_host[len("unix://"):]
+            else:
+                socket_path = DOCKER_SOCKET
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.version = None
+
+
+    def available(self):
+        ''' Check if the docker daemon socket exists and an API version
+            supported by the daemon could be negotiated
+        '''
+
+        return os.path.exists(self.socket_path) and self.api_version() is not None
+
+
+    def api_version(self):
+        ''' API version to use: DOCKER_API_VERSION, or the version of the daemon
+            (from the unversioned /version endpoint) if it is older.
+            None if the daemon could not be asked or is too old.
+        '''
+
+        if self.version is not None:
+            return self.version
+
+        result = self.request("GET", "/version", versioned=False)
+        if result["status"] == "error" or not isinstance(result["output"], dict):
+            return None
+
+        try:
+            parse = lambda version: tuple(int(part) for part in version.split("."))
+            version = min(parse(result["output"]["ApiVersion"]), parse(DOCKER_API_VERSION))
+            if version < parse(result["output"].get("MinAPIVersion", "0")):
+                return None
+        except (KeyError, ValueError, AttributeError):
+            return None
+
+        self.version = '.'.join(str(part) for part in version)
+        return self.version
+
+
+    def api_path(self, path):
+        ''' Prefix path with the negotiated API version
+        '''
+
+        return "/v" + (self.api_version() or DOCKER_API_VERSION) + path
+
+
+    def request(self, method, path, query=None, body=None, headers=None, versioned=True):
+        ''' Send an API request, JSON decoding the response body if possible.
+            body may be a dictionary (sent as JSON), a string, a file or any
+            object with a read() method, which is streamed with chunked encoding.
+        '''
+
+        if versioned:
+            path = self.api_path(path)
+
+        if query:
+            path = path + "?" + urllib.urlencode(query)
+        if headers is None:
+            headers = {}
+        if isinstance(body, dict):
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+
+        connection = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        try:
+            if hasattr(body, "read") and not isinstance(body, file):
+                self.send_chunked(connection, method, path, body, headers)
+            else:
+                connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (socket.error, httplib.HTTPException) as e:
+            return {"status" : "error", "code" : None, "output" : str(e)}
+        finally:
+            connection.close()
+
+        try:
+            data = json.loads(data) if data else None
+        except ValueError:
+            pass
+
+        if response.status >= 400:
+            message = data.get("message", data) if isinstance(data, dict) else data
+            return {"status" : "error", "code" : response.status, "output" : message}
+        return {"status" : "success", "code" : response.status, "output" : data}
+
+
+    def send_chunked(self, connection, method, url, body, headers):
+        ''' Send a request whose body is read from a stream of unknown length
+        '''
+
+        connection.putrequest(method, url)
+        for header, value in headers.items():
+            connection.putheader(header, value)
+        connection.putheader("Transfer-Encoding", "chunked")
+        connection.endheaders()
+
+        while True:
+            chunk = body.read(DOCKER_STREAM_CHUNK)
+            if not chunk:
+                break
+            connection.send("%x\r\n%s\r\n" % (len(chunk), chunk))
+        connection.send("0\r\n\r\n")
+
+
+    def containers(self, name=None, all=False):
+        ''' List containers, optionally only the one named exactly name
+        '''
+
+        query = {"all" : int(all)}
+        if name is not None:
+            # The API name filter is a regular expression on "/<name>"
+            query["filters"] = json.dumps({"name" : ["^/" + re.escape(name) + "$"]})
+        return self.request("GET", "/containers/json", query=query)
+
+
+    def container_running(self, name):
+        ''' Check if the container named exactly name is running
+        '''
+
+        result = self.containers(name=name)
+        if result["status"] == "error":
+            return result
+        running = any("/" + name in container.get("Names", []) for container in result["output"])
+        return {"status" : "success", "output" : running}
+
+
+    def import_image(self, source, repo):
+        ''' Import a root filesystem tarball (path or file object) as image repo.
+            The output is the ID of the new image.
+        '''
+
+        if isinstance(source, basestring):
+            with open(source, 'rb') as fd:
+                result = self.request("POST", "/images/create", query={"fromSrc" : "-", "repo" : repo},
+                                      body=fd, headers={"Content-Type" : "application/x-tar"})
+        else:
+            result = self.request("POST", "/images/create", query={"fromSrc" : "-", "repo" : repo},
+                                  body=source, headers={"Content-Type" : "application/x-tar"})
+
+        if result["status"] == "error":
+            return result
+
+        # The response is a stream of JSON progress messages, the last one holds the image ID
+        messages = result["output"]
+        if not isinstance(messages, basestring):
+            messages = json.dumps(messages)
+        image_id = None
+        for line in messages.splitlines():
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if "error" in message:
+                return {"status" : "error", "code" : result["code"], "output" : message["error"]}
+            image_id = message.get("status", image_id)
+        return {"status" : "success", "code" : result["code"], "output" : image_id}
+
+
+    def save_image(self, name, destination):
+        ''' Export image name (docker save format, image ID preserved) by
+            writing the tarball stream to the file object destination
+        '''
+
+        connection = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        try:
+            connection.request("GET", self.api_path("/images/" + urllib.quote(name, safe="") + "/get"))
+            response = connection.getresponse()
+            if response.status >= 400:
+                return {"status" : "error", "code" : response.status, "output" : response.read()}
+
+            size = 0
+            while True:
+                chunk = response.read(DOCKER_STREAM_CHUNK)
+                if not chunk:
+                    break
+                destination.write(chunk)
+                size += len(chunk)
+        except (socket.error, httplib.HTTPException, IOError) as e:
+            return {"status" : "error", "code" : None, "output" : str(e)}
+        finally:
+            connection.close()
+
+        return {"status" : "success", "code" : response.status, "output" : size}
+
+
+    def remove_image(self, name, force=True):
+        ''' Remove an image, a missing image is not an error
+        '''
+
+        result = self.request("DELETE", "/images/" + urllib.quote(name, safe=""), query={"force" : int(force)})
+        if result["code"] == 404:
+            return {"status" : "success", "code" : 404, "output" : None}
+        return result
+
+
+    def inspect_image(self, name):
+        ''' Image details, the output is None if the image does not exist
+        '''
+
+        result = self.request("GET", "/images/" + urllib.quote(name, safe="") + "/json")
+        if result["code"] == 404:
+            return {"status" : "success", "code" : 404, "output" : None}
+        return result
+
+
+    def inspect_container(self, name):
+        ''' Container details, the output is None if the container does not exist
+        '''
+
+        result = self.request("GET", "/containers/" + urllib.quote(name, safe="") + "/json")
+        if result["code"] == 404:
+            return {"status" : "success", "code" : 404, "output" : None}
+        return result
+
+
+    def create_container(self, name, image, cmd=None, privileged=True, binds=None):
+        ''' Create a container with tty and stdin open, like docker run -it
+        '''
+
+        config = {"Image" : image,
+                  "Tty" : True,
+                  "OpenStdin" : True,
+                  "HostConfig" : {"Privileged" : privileged,
+                                  "Binds" : binds or []}}
+        if cmd:
+            config["Cmd"] = shlex.split(cmd)
+        return self.request("POST", "/containers/create", query={"name" : name}, body=config)
+
+
+    def start_container(self, name):
+        ''' Start a container, starting a running container is not an error
+        '''
+
+        result = self.request("POST", "/containers/" + urllib.quote(name, safe="") + "/start")
+        if result["code"] == 304:
+            return {"status" : "success", "code" : 304, "output" : None}
+        return result
+
+
+    def remove_container(self, name, force=True):
+        ''' Remove a container, a missing container is not an error
+        '''
+
+        result = self.request("DELETE", "/containers/" + urllib.quote(name, safe=""), query={"force" : int(force)})
+        if result["code"] == 404:
+            return {"status" : "success", "code" : 404, "output" : None}
+        return result
+
+
+    def events(self, filters=None):
+        ''' Subscribe to the docker event stream, yielding every event as a
+            dictionary. Returns when the daemon closes the stream.
+        '''
+
+        path = self.api_path("/events")
+        if filters:
+            path = path + "?" + urllib.urlencode({"filters" : json.dumps(filters)})
+
+        connection = UnixHTTPConnection(self.socket_path, timeout=None)
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise httplib.HTTPException("Docker events request failed: " + str(response.status))
+
+            buffered = ""
+            for data in self.iter_stream(response):
+                buffered += data
+                while "\n" in buffered:
+                    line, buffered = buffered.split("\n", 1)
+                    if line.strip():
+                        yield json.loads(line)
+        finally:
+            connection.close()
+
+
+    def iter_stream(self, response):
+        ''' Yield the body of a streamed response as soon as data arrives,
+            chunk by chunk for chunked encoding, line by line otherwise
+        '''
+
+        if not response.chunked:
+            for line in iter(response.fp.readline, ""):
+                yield line
+            return
+
+        while True:
+            size_line = response.fp.readline()
+            if not size_line:
+                return
+            size = int(size_line.split(";")[0].strip(), 16)
+            if size == 0:
+                return
+            data = response.fp.read(size)
+            response.fp.readline()
+            yield data
+
+
 
 class CronAction(ZtpHelpers):
 
@@ -12,20 +456,277 @@ class CronAction(ZtpHelpers):
                  method_list=None):
 
         self.method_list = method_list
-        self.method_mapper = { 'spin_up_docker' : self.spin_up_docker}
+        self.method_mapper = { 'spin_up_docker' : self.spin_up_docker,
+                               'prestage_docker_image' : self.prestage_docker_image}
+        # Internal IP of the standby RP, looked up once
+        self.peer_rp_ip = None
+        # Next due time of every registered method, keyed by method_key()
+        self.next_run = {}
+        # Methods still running past their timeout, keyed by method_key()
+        self.overrunning = {}
+        self.state_file = CRON_STATE_FILE
+        self.lock_file = CRON_ACTION_LOCKFILE
+        self.lock_fd = None
+        self.docker = DockerClient()
+        # Containers restarted on docker events, keyed by container name
+        self.supervised = {}
+        self.supervise_lock = threading.Lock()
+        # Serialize spin_up_docker() per container, see container_lock()
+        self.container_locks = {}
+        self.state_lock = threading.Lock()
+        self.state = self.load_state()
+        self.next_run = self.state["next_run"]
+        # Node name does not change for the lifetime of the process
+        self.my_node_name = None
+        # Whether the last run_once() took the cron actions (active RP)
+        self.took_action = False
+        # Start time of the running tick, None between ticks
+        self.tick_start = None
+        # One-shot runs are started by cron every CRON_TICK_PERIOD seconds:
+        # a method falling due before the next run is run in this one.
+        # run_forever() wakes up when a method is due and sets it to 0.
+        self.schedule_slack = CRON_TICK_PERIOD / 2
         # Initialize the parent ZtpHelpers class as well
         super(CronAction, self).__init__(syslog_file=syslog_file, syslog_server=syslog_server, syslog_port=syslog_port)
 
 
+    def set_vrf(self, vrfname=None, probe_host=None, duration=30):
+        ''' Overrides set_vrf() of the parent class, which always sleeps 30
+            seconds: return as soon as the VRF is usable (see vrf_converged()),
+            waiting at most duration seconds. probe_host defaults to the
+            syslog server.
+        '''
+
+        if vrfname is not None:
+            self.vrf = vrfname
+        else:
+            self.vrf = "global-vrf"
+
+        if probe_host is None:
+            probe_host = self.syslog_server
+
+        converged = self.wait_for_vrf(probe_host=probe_host, duration=duration)
+
+        # Restart the syslogger service in the new vrf
+        self.syslogger.handlers = []
+        self.setup_syslog()
+
+        if not converged:
+            self.syslogger.info("VRF %s did not converge in %s seconds, continuing" % (self.vrf, duration))
+
+
+    def vrf_converged(self, probe_host=None):
+        ''' Check if the current VRF is usable: its netns file exists, an
+            interface is up with an address and probe_host has a route
+        '''
+
+        if not os.path.exists(self.get_netns_path(nsname=self.vrf)):
+            return False
+
+        vrf_exec = "/sbin/ip netns exec " + str(self.vrf)
+
+        # Interfaces must be administratively and operationally up
+        process = subprocess.Popen(vrf_exec + " ip -o link show up", stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return False
+
+        up_interfaces = []
+        for line in out.splitlines():
+            fields = line.split(':')
+            if len(fields) > 2 and "LOWER_UP" in line:
+                intf = fields[1].strip().split('@')[0]
+                if intf != "lo":
+                    up_interfaces.append(intf)
+
+        # ...and at least one of them must carry an address
+        process = subprocess.Popen(vrf_exec + " ip -o addr show scope global", stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return False
+
+        addressed_interfaces = [line.split()[1] for line in out.splitlines() if len(line.split()) > 1]
+
+        if not any(intf in addressed_interfaces for intf in up_interfaces):
+            return False
+
+        if probe_host is not None:
+            process = subprocess.Popen(vrf_exec + " ip route get " + str(probe_host),
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+            process.communicate()
+
+            if process.returncode:
+                return False
+
+        return True
+
+
+    def wait_for_vrf(self, probe_host=None, duration=30, interval=1):
+        ''' Wait up to duration seconds for vrf_converged(), True if it did
+        '''
+
+        t_end = time.time() + duration
+        while True:
+            if self.vrf_converged(probe_host):
+                return True
+
+            if time.time() + interval > t_end:
+                return False
+
+            time.sleep(interval)
+
+
+    def load_state(self):
+        ''' Read the state persisted by previous runs, empty state if there is none
+        '''
+
+        state = {"active_rp" : {}, "containers" : {}, "images" : {}, "standby_images" : {}, "next_run" : {},
+                 "metrics" : {"skipped_ticks" : 0, "overrun_ticks" : 0}}
+        try:
+            with open(self.state_file, 'r') as fd:
+                state.update(json.load(fd))
+        except (IOError, ValueError):
+            pass
+        return state
+
+
+    def save_state(self):
+        ''' Atomically persist the state: write a temporary file in the same
+            folder and rename it over the state file. Changes made to the file
+            by other processes are merged in first, nothing is written if the
+            result matches the file.
+        '''
+
+        with self.state_lock:
+            self.state["next_run"] = self.next_run
+            try:
+                with self.state_file_lock():
+                    on_disk = self.load_state()
+                    # Skipped ticks are counted by the processes that did not get the lock
+                    for metric in ["skipped_ticks", "last_skipped"]:
+                        if metric in on_disk["metrics"]:
+                            self.state["metrics"][metric] = on_disk["metrics"][metric]
+                    # Images pre-staged by the active RP are recorded directly in the file
+                    for image, record in on_disk["images"].items():
+                        if record.get("timestamp", 0) > self.state["images"].get(image, {}).get("timestamp", 0):
+                            self.state["images"][image] = record
+                    if json.dumps(self.state, sort_keys=True) != json.dumps(on_disk, sort_keys=True):
+                        self.write_state(self.state)
+            except (IOError, OSError) as e:
+                self.syslogger.info("Failed to save Cron Action state: " + str(e))
+                return {"status" : "error", "output" : str(e)}
+
+        return {"status" : "success", "output" : self.state_file}
+
+
+    def write_state(self, state):
+        ''' Write state to a temporary file in the same folder and rename it
+            over the state file
+        '''
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_file))
+        with os.fdopen(fd, 'w') as tmp_fd:
+            json.dump(state, tmp_fd)
+            tmp_fd.flush()
+            os.fsync(tmp_fd.fileno())
+        os.rename(tmp_path, self.state_file)
+
+
+    def state_file_lock(self):
+        ''' Exclusive lock serialising read-modify-write cycles of the state
+            file between processes, to be used in a with statement
+        '''
+
+        lock_fd = open(self.state_file + ".lock", 'a')
+        fcntl.flock(lock_fd.fileno(), fcntl.LOCK_EX)
+        return lock_fd
+
+
+    def record_tick_metric(self, metric):
+        ''' Count a skipped or overrun tick in the persisted metrics.
+            metric is "skipped" or "overrun".
+        '''
+
+        self.syslogger.info("Cron Action tick " + metric)
+
+        if metric == "skipped":
+            # This process does not own the state, update the file directly
+            try:
+                with self.state_file_lock():
+                    state = self.load_state()
+                    state["metrics"]["skipped_ticks"] = state["metrics"].get("skipped_ticks", 0) + 1
+                    state["metrics"]["last_skipped"] = time.time()
+                    self.write_state(state)
+            except (IOError, OSError) as e:
+                self.syslogger.info("Failed to record skipped tick: " + str(e))
+        else:
+            with self.state_lock:
+                metrics = self.state.setdefault("metrics", {})
+                metrics[metric + "_ticks"] = metrics.get(metric + "_ticks", 0) + 1
+                metrics["last_" + metric] = time.time()
+
+
+    def update_state(self, section, key, value):
+        ''' Thread safe update of one entry of the persisted state
+        '''
+
+        with self.state_lock:
+            self.state.setdefault(section, {})[key] = value
+
+
+    def redundancy_fingerprint(self):
+        ''' Fingerprint of this node for the cached active RP result: the
+            kernel boot id. The active RP is reloaded when it loses its role
+            in a switchover, so a cached "active" result never outlives it.
+        '''
+
+        try:
+            with open("/proc/sys/kernel/random/boot_id", 'r') as fd:
+                return fd.read().strip()
+        except IOError as e:
+            self.syslogger.info("Failed to compute redundancy fingerprint: " + str(e))
+            return None
+
+
     def is_active_rp(self):
-        '''method to check if the node executing this script is the active RP
+        '''method to check if the node executing this script is the active RP.
+           Only a positive result is cached: it is reused while the boot id is
+           unchanged and the result is younger than ACTIVE_RP_STATE_TTL.
+           A node that is not active queries XR every time, so a standby
+           that takes over after a switchover notices on its next tick.
+        '''
+
+        fingerprint = self.redundancy_fingerprint()
+        cached = self.state.get("active_rp", {})
+
+        if (cached.get("output") and fingerprint is not None and cached.get("fingerprint") == fingerprint and
+                time.time() - cached.get("timestamp", 0) < ACTIVE_RP_STATE_TTL):
+            return {"status" : "success", "output" : True, "warning" : ""}
+
+        result = self.query_active_rp()
+
+        if result["status"] == "success":
+            with self.state_lock:
+                if result["output"] and fingerprint is not None:
+                    self.state["active_rp"] = {"fingerprint" : fingerprint,
+                                               "output" : True,
+                                               "timestamp" : time.time()}
+                else:
+                    self.state["active_rp"] = {"output" : False}
+        return result
+
+
+    def query_active_rp(self):
+        '''Query XR for the active RP and compare it with this node
         '''
         # Get the current active RP node-name
         exec_cmd = "show redundancy summary"
         show_red_summary = self.xrcmd({"exec_cmd" : exec_cmd})
 
         if show_red_summary["status"] == "error":
-             self.sylogger.info("Failed to get show redundancy summary output from XR")
+             self.syslogger.info("Failed to get show redundancy summary output from XR")
              return {"status" : "error", "output" : "", "warning" : "Failed to get show redundancy summary output"}
 
         else:
@@ -35,80 +736,961 @@ class CronAction(ZtpHelpers):
                 self.syslogger.info("Failed to get Active RP from show redundancy summary output")
                 return {"status" : "error", "output" : "", "warning" : "Failed to get Active RP, error: " + str(e)}
 
-        cmd = "/sbin/ip netns exec xrnns /pkg/bin/node_list_generation -f MY"
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-        out, err = process.communicate()
-        my_node_name = ''
-
-        if not process.returncode:
-            my_node_name = out
-        else:
-            self.syslogger.info("Failed to get My Node Name")
-            
+        my_node_name = self.get_my_node_name()
+        if my_node_name["status"] == "error":
+            return {"status" : "error", "output" : "", "warning" : "Failed to get My Node Name"}
 
-        if current_active_rp == my_node_name:
+        if current_active_rp == my_node_name["output"]:
             self.syslogger.info("Cron Job: I am the current RP, take action")
             return {"status" : "success", "output" : True, "warning" : ""}    
         else:
             self.syslogger.info("Cron Job: I am not the current RP")
             return {"status" : "success", "output" : False, "warning" : ""} 
 
-    def take_cron_action(self):
-        ''' Wrapper method that executes a set of registered CronAction methods
+
+    def get_my_node_name(self):
+        '''Name of this node in the format used by XR show commands, e.g.
+           0/RP0/CPU0, converted with node_conversion -N
+        '''
+
+        if self.my_node_name is not None:
+            return {"status" : "success", "output" : self.my_node_name}
+
+        cmd = ("/sbin/ip netns exec xrnns /pkg/bin/node_conversion -N "
+               "$(/sbin/ip netns exec xrnns /pkg/bin/node_list_generation -f MY)")
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode or not out.strip():
+            self.syslogger.info("Failed to get My Node Name")
+            return {"status" : "error", "output" : ""}
+
+        self.my_node_name = out.strip()
+        return {"status" : "success", "output" : self.my_node_name}
+
+
+    def register_method(self, name, method):
+        ''' Make a callable available to the method list/manifest under name
+        '''
+
+        self.method_mapper[name] = method
+
+
+    def load_manifest(self, manifest=None):
+        ''' Load the method list from a JSON manifest, either a local file or
+            an http(s) URL downloaded in the current VRF. Format:
+
+            { "methods" : [ { "name" : "spin_up_docker",
+                              "args" : { ... },
+                              "interval" : 600,
+                              "jitter" : 30,
+                              "timeout" : 300,
+                              "depends_on" : [ "other_method" ] } ] }
+
+            interval and jitter are in seconds, timeout (seconds) and
+            depends_on are optional.
+        '''
+
+        if manifest is None:
+            self.syslogger.info("No Cron Action manifest specified")
+            return {"status" : "error", "output" : "No manifest specified"}
+
+        if manifest.startswith("http://") or manifest.startswith("https://"):
+            manifest_download = self.download_file(manifest, destination_folder=CRON_MANIFEST_FOLDER)
+
+            if manifest_download["status"] == "error":
+                self.syslogger.info("Failed to download Cron Action manifest")
+                return {"status" : "error", "output" : "Failed to download manifest"}
+
+            manifest = os.path.join(manifest_download["folder"], manifest_download["filename"])
+
+        try:
+            with open(manifest, 'r') as fd:
+                manifest_data = json.load(fd)
+        except Exception as e:
+            self.syslogger.info("Failed to load Cron Action manifest: " + str(e))
+            return {"status" : "error", "output" : str(e)}
+
+        if isinstance(manifest_data, dict):
+            manifest_data = manifest_data.get("methods", [])
+
+        method_list = []
+        for method in manifest_data:
+            if method.get("name") not in self.method_mapper:
+                self.syslogger.info("Skipping unknown cron method in manifest: " + str(method.get("name")))
+                continue
+            method.setdefault("args", {})
+            method_list.append(method)
+
+        self.method_list = method_list
+        self.syslogger.info("Loaded " + str(len(method_list)) + " cron methods from manifest")
+        return {"status" : "success", "output" : method_list}
+
+
+    def method_key(self, method):
+        ''' Identity of a method entry: its name and arguments
+        '''
+
+        return method["name"] + ":" + json.dumps(method["args"], sort_keys=True)
+
+
+    def method_name(self, key):
+        ''' Method name part of a method_key()
+        '''
+
+        return key.split(":", 1)[0]
+
+
+    def method_due(self, method, now=None):
+        ''' Check if a method is due (within schedule_slack seconds), methods
+            run on their first tick
+        '''
+
+        if now is None:
+            now = time.time()
+        return self.next_run.get(self.method_key(method), 0) - self.schedule_slack <= now
+
+
+    def schedule_method(self, method, now=None):
+        ''' Set the next due time of a method to interval (+ random jitter) from now
+        '''
+
+        if now is None:
+            now = time.time()
+        interval = method.get("interval", DEFAULT_METHOD_INTERVAL)
+        jitter = method.get("jitter", DEFAULT_METHOD_JITTER)
+        self.next_run[self.method_key(method)] = now + interval + random.uniform(0, jitter)
+
+
+    def next_due(self):
+        ''' Earliest time at which any registered method is due
+        '''
+
+        if not self.method_list:
+            return None
+        scheduled = [self.next_run[self.method_key(method)] for method in self.method_list
+                     if self.method_key(method) in self.next_run]
+        if not scheduled:
+            return None
+        return min(scheduled)
+
+
+    def run_method(self, method):
+        ''' Execute a single method entry, honouring its timeout. A method that
+            times out keeps running in the background and is not started
+            again until it finishes.
+        '''
+
+        key = self.method_key(method)
+        running = self.overrunning.get(key)
+
+        if running is not None:
+            if running.is_alive():
+                return {"status" : "error", "output" : "Previous run still in progress"}
+            del self.overrunning[key]
+
+        method_obj = self.method_mapper[method["name"]]
+        task = BackgroundTask(method_obj, **method["args"])
+        task.start()
+        method_out = task.wait(method.get("timeout", DEFAULT_METHOD_TIMEOUT))
+
+        if task.is_alive():
+            self.overrunning[key] = task
+            self.syslogger.info("Cron method " + str(method["name"]) + " timed out")
+            return {"status" : "error", "output" : "Timed out"}
+
+        if task.error is not None:
+            self.syslogger.info("Cron method " + str(method["name"]) + " raised: " + str(task.error))
+            return {"status" : "error", "output" : str(task.error)}
+
+        if method_out is None:
+            return {"status" : "error", "output" : "No result returned"}
+
+        return method_out
+
+
+    def take_cron_action(self, max_workers=CRON_MAX_WORKERS):
+        ''' Wrapper method that executes the registered CronAction methods that are due.
+            Independent methods run concurrently, up to max_workers at a time.
+            A method entry may list method names in "depends_on": it then runs
+            only after those methods (if due in the same tick) have succeeded.
+            Entries with the same name and args are executed once.
         '''
 
         if self.method_list is not None:
-            self.syslogger.info("Executing all the Registered Cron functions")
+            self.syslogger.info("Executing all the due Registered Cron functions")
             try:            
+                pending = {}
                 for method in self.method_list:
-                    method_obj = self.method_mapper[method["name"]]
-                    method_out = method_obj(**method["args"])
+                    key = self.method_key(method)
+                    if key in pending:
+                        self.syslogger.info("Skipping duplicate cron method: " + key)
+                        continue
+                    if self.method_due(method):
+                        pending[key] = method
+
+                # Schedule from the tick start so that a slow tick does not
+                # push the next run back
+                for method in pending.values():
+                    self.schedule_method(method, now=self.tick_start)
+
+                due_names = set(method["name"] for method in pending.values())
+                results = {}
+                failed = set()
+
+                while pending:
+                    pending_count = len(pending)
+                    pending_names = set(method["name"] for method in pending.values())
+                    ready = []
+                    for key, method in pending.items():
+                        depends_on = (set(method.get("depends_on", [])) & due_names) - set([method["name"]])
+                        if depends_on & failed:
+                            results[key] = {"status" : "error", "output" : "Dependency failed"}
+                            failed.add(method["name"])
+                            del pending[key]
+                        elif not depends_on & pending_names:
+                            ready.append(key)
+
+                    if not ready:
+                        if len(pending) == pending_count:
+                            # Whatever is left waits on a dependency cycle
+                            for key, method in pending.items():
+                                results[key] = {"status" : "error", "output" : "Unresolvable dependencies"}
+                            pending = {}
+                        continue
+
+                    while ready:
+                        batch, ready = ready[:max_workers], ready[max_workers:]
+                        tasks = [(key, BackgroundTask(self.run_method, pending.pop(key))) for key in batch]
+                        for key, task in tasks:
+                            task.start()
+                        for key, task in tasks:
+                            results[key] = task.wait()
+                            if results[key]["status"] == "error":
+                                failed.add(self.method_name(key))
+
+                for key, method_out in results.items():
                     if method_out["status"] == "error":
-                        self.syslogger.info("Error executing cron method: " +str(method_obj.__name__)+ " :" + method_out["output"])
-                        return {"status" : "error", "output" : 'method_out["output"]'}
+                        self.syslogger.info("Error executing cron method: " + key + " :" + str(method_out["output"]))
                     else:  
-                       self.syslogger.info("Result for cron function: " +str(method_obj.__name__)+" is " + json.dumps(method_obj(**method["args"])))
-                return {"status" : "success", "output" : "Successfully executed all cron methods"}
+                        self.syslogger.info("Result for cron function: " + key + " is " + json.dumps(method_out))
+
+                if any(method_out["status"] == "error" for method_out in results.values()):
+                    return {"status" : "error", "output" : results}
+                return {"status" : "success", "output" : results}
             except Exception as e:
                 self.syslogger.info("Failure while executing methodlist: " + str(e))
                 return {"status" : "error", "output" : str(e)}
 
 
+    def run_once(self):
+        ''' Single cron tick: take the cron actions if this node is the active RP
+        '''
+
+        self.took_action = False
+        self.tick_start = time.time()
+        try:
+            result = self.is_active_rp()
+
+            if result["status"] == "error":
+                return {"status" : "error", "output" : result["warning"]}
+
+            if not result["output"]:
+                self.save_state()
+                return {"status" : "success", "output" : "Not the active RP, no action taken"}
+
+            self.syslogger.info("Executing Cron Actions")
+            self.took_action = True
+            method_run = self.take_cron_action()
+            if method_run["status"] == "error":
+                self.syslogger.info("Error executing cron methods on active RP: "+str(method_run["output"]))
+            else:
+                self.syslogger.info("Successfully ran the Cron Methods on active RP")
+            self.save_state()
+            return method_run
+        finally:
+            self.tick_start = None
+
+
+    def acquire_lock(self, stale_age=CRON_LOCK_STALE_AGE):
+        ''' Become the single running CronAction instance by taking an flock on
+            the lock file. A lock held by a dead process (e.g. through an
+            inherited descriptor) or whose heartbeat is older than stale_age is
+            broken: the holder is killed and the lock file recreated.
+            Returns True if this process now holds the lock.
+        '''
+
+        for attempt in range(3):
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0644)
+            # Commands spawned by cron methods must not inherit the lock
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    os.close(fd)
+                    raise
+                holder = os.read(fd, 32).strip()
+                os.close(fd)
+
+                if not self.lock_stale(holder, stale_age):
+                    return False
+
+                self.syslogger.info("Breaking stale Cron Action lock held by pid " + str(holder))
+                try:
+                    os.kill(int(holder), signal.SIGKILL)
+                except (OSError, ValueError):
+                    pass
+                try:
+                    os.unlink(self.lock_file)
+                except OSError:
+                    pass
+                continue
+
+            # The file may have been replaced by a stale lock breaker meanwhile
+            try:
+                same_file = os.fstat(fd).st_ino == os.stat(self.lock_file).st_ino
+            except OSError:
+                same_file = False
+
+            if not same_file:
+                os.close(fd)
+                continue
+
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()))
+            self.lock_fd = fd
+            BackgroundTask(self.keep_alive).start()
+            return True
+
+        return False
+
+
+    def lock_stale(self, holder, stale_age=CRON_LOCK_STALE_AGE):
+        ''' Check if the lock held by pid holder can be broken
+        '''
+
+        try:
+            os.kill(int(holder), 0)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                return True
+        except ValueError:
+            pass
+
+        try:
+            return time.time() - os.stat(self.lock_file).st_mtime > stale_age
+        except OSError:
+            return True
+
+
+    def heartbeat(self):
+        ''' Refresh the lock file mtime to show this instance is making progress
+        '''
+
+        try:
+            os.utime(self.lock_file, None)
+        except OSError as e:
+            self.syslogger.info("Failed to update Cron Action heartbeat: " + str(e))
+
+
+    def keep_alive(self, period=CRON_HEARTBEAT_PERIOD, max_tick_age=CRON_TICK_MAX_AGE):
+        ''' Refresh the heartbeat every period seconds while this process holds
+            the lock, so that a long running method (e.g. a large docker
+            import) is not mistaken for a hung process. A tick running for
+            more than max_tick_age seconds is considered hung and the
+            heartbeat is left to go stale.
+        '''
+
+        while True:
+            tick_start = self.tick_start
+            if tick_start is None or time.time() - tick_start < max_tick_age:
+                self.heartbeat()
+            time.sleep(period)
+
+
+    def run_forever(self, interval=60):
+        ''' Resident mode: run a cron tick every interval seconds, or earlier
+            when a method falls due, reusing the
+            logger, network namespace and caches set up by this process.
+            cron only acts as a watchdog that restarts this loop if it dies
+            or its heartbeat goes stale. Call acquire_lock() first.
+        '''
+
+        self.syslogger.info("Starting Cron Action daemon, tick interval: " + str(interval) + "s")
+        self.schedule_slack = 0
+
+        if self.docker.available():
+            BackgroundTask(self.watch_docker_events).start()
+
+        while True:
+            tick_start = time.time()
+            self.heartbeat()
+            try:
+                self.run_once()
+            except Exception as e:
+                self.syslogger.info("Cron tick failed: " + str(e))
+
+            if time.time() - tick_start > interval:
+                self.record_tick_metric("overrun")
+                self.save_state()
+
+            # Wake up early if a method falls due before the next tick. Only
+            # methods scheduled by an active RP tick count, a standby keeps
+            # to the tick interval.
+            next_tick = tick_start + interval
+            next_due = self.next_due() if self.took_action else None
+            if next_due is not None:
+                next_tick = min(next_tick, next_due)
+            time.sleep(max(1, next_tick - time.time()))
+
+
+    def watch_docker_events(self):
+        ''' Resident mode: follow the docker event stream and react to
+            containers dying or running out of memory, resubscribing if the
+            stream breaks
+        '''
+
+        while True:
+            try:
+                for event in self.docker.events(filters={"type" : ["container"], "event" : ["die", "oom"]}):
+                    self.handle_docker_event(event)
+            except Exception as e:
+                self.syslogger.info("Docker event stream failed: " + str(e))
+            time.sleep(DOCKER_EVENTS_RETRY)
+
+
+    def supervise_container(self, docker_name, restart_policy, max_restarts, spin_up_args):
+        ''' Register a container to be restarted on die/oom events.
+            restart_policy is "always", "on-failure" (non-zero exit or oom)
+            or "no". max_restarts bounds consecutive restarts, None for no limit.
+        '''
+
+        with self.supervise_lock:
+            supervisor = self.supervised.setdefault(docker_name, {"failures" : 0, "last_restart" : 0,
+                                                                  "pending" : False, "oom" : False})
+            supervisor.update({"policy" : restart_policy,
+                               "max_restarts" : max_restarts,
+                               "args" : spin_up_args})
+
+
+    def container_lock(self, docker_name):
+        ''' Lock held while a container is being brought up, so that a
+            restart scheduled by the event watcher and a cron tick never spin
+            up the same container concurrently
+        '''
+
+        with self.supervise_lock:
+            return self.container_locks.setdefault(docker_name, threading.Lock())
+
+
+    def handle_docker_event(self, event):
+        ''' Schedule the restart of a supervised container that died, backing
+            off exponentially on consecutive restarts
+        '''
+
+        action = event.get("Action", event.get("status"))
+        name = event.get("Actor", {}).get("Attributes", {}).get("name")
+        exit_code = event.get("Actor", {}).get("Attributes", {}).get("exitCode", "0")
+
+        with self.supervise_lock:
+            supervisor = self.supervised.get(name)
+
+            if supervisor is None:
+                return
+
+            if action == "oom":
+                supervisor["oom"] = True
+                return
+
+            if action != "die":
+                return
+
+            oom, supervisor["oom"] = supervisor["oom"], False
+            self.syslogger.info("Docker container " + str(name) + " died, exit code: " + str(exit_code) +
+                                (" (out of memory)" if oom else ""))
+
+            if supervisor["policy"] == "no" or supervisor["pending"]:
+                return
+            if supervisor["policy"] == "on-failure" and exit_code == "0" and not oom:
+                return
+
+            now = time.time()
+            if now - supervisor["last_restart"] > RESTART_RESET_AFTER:
+                supervisor["failures"] = 0
+
+            if supervisor["max_restarts"] is not None and supervisor["failures"] >= supervisor["max_restarts"]:
+                self.syslogger.info("Giving up restarting docker container " + str(name))
+                return
+
+            delay = min(RESTART_BACKOFF_BASE * 2 ** supervisor["failures"], RESTART_BACKOFF_MAX)
+            supervisor["failures"] += 1
+            supervisor["last_restart"] = now + delay
+            supervisor["pending"] = True
+
+        self.syslogger.info("Restarting docker container " + str(name) + " in " + str(delay) + "s")
+        timer = threading.Timer(delay, self.restart_container, [name])
+        timer.daemon = True
+        timer.start()
+
+
+    def restart_container(self, docker_name):
+        ''' Bring a supervised container back up through spin_up_docker(),
+            only on the active RP
+        '''
+
+        supervisor = self.supervised[docker_name]
+
+        try:
+            if not self.state.get("active_rp", {}).get("output"):
+                self.syslogger.info("Not the active RP, not restarting " + str(docker_name))
+                return
+
+            lock = self.container_lock(docker_name)
+            if not lock.acquire(False):
+                # The cron tick is already bringing the container up
+                self.syslogger.info("Docker container " + str(docker_name) + " is being spun up, skip restart")
+                return
+            try:
+                result = self._spin_up_docker(**supervisor["args"])
+            finally:
+                lock.release()
+            self.syslogger.info("Restart of docker container " + str(docker_name) + ": " + str(result["output"]))
+        finally:
+            supervisor["pending"] = False
+
+
     def _check_docker_running(self, docker_name):
         '''Internal helper method to check if a docker with name docker_name is running
         '''
 
+        if self.docker.available():
+            result = self.docker.container_running(docker_name)
+            if result["status"] == "error":
+                self.syslogger.info("Failed to get docker state: " + str(result["output"]))
+            running = result["status"] == "success" and result["output"]
+        else:
+            running = self._check_docker_running_cli(docker_name)
+
+        if running:
+            self.syslogger.info("Docker container " +str(docker_name)+ " is running")
+        self.update_state("containers", docker_name, {"running" : running, "timestamp" : time.time()})
+        return {"status" : running}
+
+
+    def _check_docker_running_cli(self, docker_name):
+        '''Fallback for _check_docker_running when the docker socket is not available
+        '''
+
         cmd = "sudo -i docker ps -f name="+str(docker_name)
 
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
         out, err = process.communicate()
 
-        if not process.returncode:
-            docker_state = out 
-        else:
+        if process.returncode:
             self.syslogger.info("Failed to get docker state")
-     
-        output_list = []
-        output = ''
- 
+            return False
+
         for line in out.splitlines():
-            fixed_line= line.replace("\n", " ").strip()
-            output_list.append(fixed_line)
-            output = filter(None, output_list)    # Removing empty items
+            if line.strip() and line.split()[-1] == docker_name:
+                return True
+        return False
+
 
-        for line in output:
-            if line.split()[-1] == docker_name:
-                self.syslogger.info("Docker container " +str(docker_name)+ " is running")
-                return {"status" : True}
-       
-        return {"status" : False}
-     
+    def _docker_import(self, filepath, docker_image_name):
+        '''Internal helper method to import a tarball as docker_image_name.
+           Returns the ID of the imported image as output.
+        '''
+
+        if self.docker.available():
+            return self.docker.import_image(filepath, docker_image_name)
+
+        cmd = "sudo -i docker import " +str(filepath)+ "  " + str(docker_image_name)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return {"status" : "error", "output" : out}
+        # docker import prints the ID (digest) of the new image
+        return {"status" : "success", "output" : out.strip()}
+
+
+    def _docker_image_id(self, docker_image_name):
+        '''Internal helper method returning the ID (digest) of the local image
+           docker_image_name, None if the image is not present
+        '''
+
+        if self.docker.available():
+            result = self.docker.inspect_image(docker_image_name)
+            if result["status"] == "error" or result["output"] is None:
+                return None
+            return result["output"].get("Id")
+
+        cmd = "sudo -i docker inspect --format '{{.Id}}' " + str(docker_image_name)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return None
+        return out.strip()
+
+
+    def _docker_container_image(self, docker_name):
+        '''Internal helper method returning the ID of the image the existing
+           container docker_name was created from, None if there is no such container
+        '''
+
+        if self.docker.available():
+            result = self.docker.inspect_container(docker_name)
+            if result["status"] == "error" or result["output"] is None:
+                return None
+            return result["output"].get("Image")
+
+        cmd = "sudo -i docker inspect --type container --format '{{.Image}}' " + str(docker_name)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return None
+        return out.strip()
+
+
+    def _docker_start(self, docker_name):
+        '''Internal helper method to (re)start an existing container
+        '''
+
+        if self.docker.available():
+            return self.docker.start_container(docker_name)
+
+        cmd = "sudo -i docker start " + str(docker_name)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return {"status" : "error", "output" : err}
+        return {"status" : "success", "output" : out.strip()}
+
+
+    def _start_from_local_image(self, docker_name, docker_image_name, docker_image_url,
+                                docker_image_digest, docker_cmd):
+        '''Internal helper method to bring up docker_name without downloading
+           anything, if docker_image_name is present locally with the expected
+           digest. The expected digest defaults to the one recorded when the
+           image was last imported from docker_image_url.
+        '''
+
+        if docker_image_digest is None:
+            recorded = self.state.get("images", {}).get(docker_image_name, {})
+            if recorded.get("url") != docker_image_url:
+                return False
+            docker_image_digest = recorded.get("digest")
+
+        if not docker_image_digest or self._docker_image_id(docker_image_name) != docker_image_digest:
+            return False
+
+        # Restart the existing container if it runs the expected image (it may
+        # be left over from an older image), recreate it otherwise
+        container_image = self._docker_container_image(docker_name)
+        if container_image == docker_image_digest:
+            if self._docker_start(docker_name)["status"] == "success":
+                if self._check_docker_running(docker_name)["status"]:
+                    self.syslogger.info("Restarted docker container " + str(docker_name) + " from local image")
+                    return True
+        elif container_image is not None:
+            self.syslogger.info("Docker container " + str(docker_name) + " runs an outdated image, recreating it")
+
+        if self._docker_run(docker_name, docker_image_name, docker_cmd)["status"] == "success":
+            if self._check_docker_running(docker_name)["status"]:
+                self.syslogger.info("Started docker container " + str(docker_name) + " from local image")
+                return True
+
+        return False
+
+
+    def _download_and_import(self, docker_image_url, docker_image_name, scratch_folder, md5sum=None):
+        '''Internal helper method to download the image tarball to scratch_folder
+           and import it as docker_image_name
+        '''
+
+        docker_download = self.download_file(docker_image_url, destination_folder=scratch_folder, md5sum=md5sum)
+
+        if docker_download["status"] == "error":
+            self.syslogger.info("Failed to download docker container tar ball")
+            return {"status" : "error", "output" : "Failed to download docker container tar ball"} 
+
+        filepath = os.path.join(docker_download["folder"], docker_download["filename"])
+        return self._docker_import(filepath, docker_image_name)
+
+
+    def _docker_import_stream(self, docker_image_url, docker_image_name, md5sum=None):
+        '''Internal helper method to pipe the image tarball from docker_image_url
+           straight into docker import, hashing it on the way. Nothing is
+           written to disk apart from the image itself.
+        '''
+
+        # Network namespaces are per thread, enter the VRF in the calling thread
+        with open(self.get_netns_path(nsname=self.vrf)) as fd:
+            self.setns(fd, CLONE_NEWNET)
+
+            try:
+                response = urlopen(Request(docker_image_url))
+            except HTTPError as e:
+                self.syslogger.info("HTTP Error: %s, %s" % (e.code , docker_image_url))
+                return {"status" : "error", "output" : "HTTP Error: " + str(e.code)}
+            except URLError as e:
+                self.syslogger.info("URL Error: %s, %s" % (e.reason , docker_image_url))
+                return {"status" : "error", "output" : "URL Error: " + str(e.reason)}
+
+            self.syslogger.info("Streaming docker image from URL:%s" % docker_image_url)
+            content_length = response.info().getheader("Content-Length")
+            reader = HashingReader(response)
+
+            try:
+                if self.docker.available():
+                    docker_import = self.docker.import_image(reader, docker_image_name)
+                else:
+                    cmd = "sudo -i docker import - " + str(docker_image_name)
+                    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True)
+                    try:
+                        for chunk in self.read_in_chunks(reader, DOCKER_STREAM_CHUNK):
+                            process.stdin.write(chunk)
+                    except IOError:
+                        # docker import exited early, its exit code tells why
+                        pass
+                    out, err = process.communicate()
+
+                    if process.returncode:
+                        docker_import = {"status" : "error", "output" : out}
+                    else:
+                        docker_import = {"status" : "success", "output" : out.strip()}
+            except Exception as e:
+                self.syslogger.info("Exception while streaming the docker image: %s" % str(e))
+                return {"status" : "error", "output" : str(e)}
+            finally:
+                response.close()
+
+        if docker_import["status"] == "error":
+            return docker_import
+
+        # A connection closed early looks like the end of the tarball to
+        # docker import, which happily imports the truncated image
+        if content_length is not None and content_length.isdigit() and reader.size < int(content_length):
+            self.syslogger.info("Docker image stream truncated: received %d of %s bytes" % (reader.size, content_length))
+            self._docker_remove_image(docker_image_name)
+            return {"status" : "error", "output" : "Truncated image download"}
+
+        self.syslogger.info("MD5 Sum of the streamed image is: %s" % reader.hexdigest())
+
+        if md5sum and md5sum != reader.hexdigest():
+            self.syslogger.info("MD5sums of streamed image and remote file didn't match")
+            self._docker_remove_image(docker_image_name)
+            return {"status" : "error", "output" : "MD5sum mismatch"}
+
+        return docker_import
+
+
+    def _docker_remove_image(self, docker_image_name):
+        '''Internal helper method to remove a bad image after an import
+        '''
+
+        if self.docker.available():
+            self.docker.remove_image(docker_image_name)
+        else:
+            process = subprocess.Popen("sudo -i docker rmi -f " + str(docker_image_name),
+                                       stdout=subprocess.PIPE, shell=True)
+            process.communicate()
+
+
+    def _docker_run(self, docker_name, docker_image_name, docker_cmd):
+        '''Internal helper method to replace container docker_name with a new
+           container of docker_image_name running docker_cmd
+        '''
+
+        if self.docker.available():
+            # We don't know why the container died, so remove properly before continuing
+            self.docker.remove_container(docker_name)
+            result = self.docker.create_container(docker_name, docker_image_name, cmd=docker_cmd,
+                                                  privileged=True, binds=["/var/run/netns:/var/run/netns"])
+            if result["status"] == "error":
+                return result
+            return self.docker.start_container(docker_name)
+
+        # We don't know why the container died, so remove properly before continuing
+        try:
+            cmd = "sudo -i docker rm -f "+str(docker_name)
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+            out, err = process.communicate()
+        except:
+            # Ignoring exception ,for the first launch 
+            pass 
+
+        cmd = "sudo -i docker run -itd --privileged -v /var/run/netns:/var/run/netns --name " +str(docker_name) +  " " + str(docker_image_name) + " " + str(docker_cmd) 
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return {"status" : "error", "output" : out}
+        return {"status" : "success", "output" : out.strip()}
+
+
+
+    def get_peer_rp_ip(self):
+        '''Internal IP address of the standby RP, empty if there is none
+        '''
+
+        if self.peer_rp_ip is not None:
+            return {"status" : "success", "output" : self.peer_rp_ip}
+
+        my_node_name = self.get_my_node_name()
+        if my_node_name["status"] == "error":
+            return {"status" : "error", "output" : ""}
+
+        cmd = "/sbin/ip netns exec xrnns /pkg/bin/node_list_generation -f ALL"
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            self.syslogger.info("Failed to get Node Name List")
+            return {"status" : "error", "output" : ""}
+
+        peer_rp_ip = ""
+        for node in out.split():
+            if "RP" in node and node != my_node_name["output"]:
+                cmd = "/sbin/ip netns exec xrnns /pkg/bin/admin_nodeip_from_nodename -n " + str(node)
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+                out, err = process.communicate()
+
+                if process.returncode:
+                    self.syslogger.info("Failed to get Peer RP IP")
+                    return {"status" : "error", "output" : ""}
+                peer_rp_ip = out.strip()
+                break
+
+        self.peer_rp_ip = peer_rp_ip
+        return {"status" : "success", "output" : peer_rp_ip}
+
+
+    def _standby_cmd(self, peer_rp_ip, cmd):
+        '''Internal helper method wrapping cmd to run on the standby RP over ssh
+        '''
+
+        return ("/sbin/ip netns exec xrnns ssh -o ConnectTimeout=10 root@" + str(peer_rp_ip) +
+                " " + pipes.quote(cmd))
+
+
+    def _standby_image_id(self, peer_rp_ip, docker_image_name):
+        '''Internal helper method returning the ID of docker_image_name on the
+           standby RP, None if it is not present there
+        '''
+
+        cmd = STANDBY_DOCKER + " inspect --format '{{.Id}}' " + pipes.quote(docker_image_name)
+        process = subprocess.Popen(self._standby_cmd(peer_rp_ip, cmd), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            return None
+        return out.strip()
+
+
+    def prestage_docker_image(self, docker_image_name='cronimg', docker_image_url=None):
+        '''A CronAction method keeping docker_image_name replicated to the
+           standby RP ahead of a switchover. The image is streamed with docker
+           save/load, which keeps its ID, and recorded in the state file of
+           the standby with docker_image_url. After a switchover the new
+           active RP then finds a current local image and only runs the
+           container (see spin_up_docker).
+        '''
+
+        peer_rp = self.get_peer_rp_ip()
+
+        if peer_rp["status"] == "error":
+            return {"status" : "error", "output" : "Failed to get standby RP IP"}
+        if not peer_rp["output"]:
+            return {"status" : "success", "output" : "No standby RP present"}
+        peer_rp_ip = peer_rp["output"]
+
+        digest = self._docker_image_id(docker_image_name)
+
+        if digest is None:
+            self.syslogger.info("Docker image " + str(docker_image_name) + " not present, nothing to pre-stage")
+            return {"status" : "error", "output" : "Docker image not present locally"}
+
+        if self._standby_image_id(peer_rp_ip, docker_image_name) != digest:
+            self.syslogger.info("Pre-staging docker image " + str(docker_image_name) + " on standby RP")
+            load_cmd = self._standby_cmd(peer_rp_ip, STANDBY_DOCKER + " load")
+
+            if self.docker.available():
+                process = subprocess.Popen(load_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=True)
+                docker_save = self.docker.save_image(docker_image_name, process.stdin)
+                out, err = process.communicate()
+                if docker_save["status"] == "error":
+                    self.syslogger.info("Failed to export docker image: " + str(docker_save["output"]))
+            else:
+                cmd = "sudo -i docker save " + str(docker_image_name) + " | " + load_cmd
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
+                out, err = process.communicate()
+
+            standby_digest = self._standby_image_id(peer_rp_ip, docker_image_name)
+
+            if standby_digest != digest:
+                self.syslogger.info("Docker image digest on standby RP does not match: " + str(standby_digest))
+                return {"status" : "error", "output" : "Failed to pre-stage docker image on standby RP"}
+
+        record = {"url" : docker_image_url, "digest" : digest, "timestamp" : time.time()}
+        cmd = ("python -c " + pipes.quote(STANDBY_STATE_UPDATE_SCRIPT) + " " +
+               " ".join(pipes.quote(arg) for arg in [self.state_file, "images", docker_image_name, json.dumps(record)]))
+        process = subprocess.Popen(self._standby_cmd(peer_rp_ip, cmd), stdout=subprocess.PIPE, shell=True)
+        out, err = process.communicate()
+
+        if process.returncode:
+            self.syslogger.info("Failed to record pre-staged image in standby RP state")
+            return {"status" : "error", "output" : "Failed to update standby RP state"}
+
+        self.update_state("standby_images", docker_image_name, record)
+        return {"status" : "success", "output" : "Docker image " + str(digest) + " pre-staged on standby RP"}
 
 
     def spin_up_docker(self, scratch_folder='/misc/app_host/scratch', 
                        docker_name='crondock', docker_image_name='cronimg',
-                       docker_image_url=None, docker_cmd='bash'): 
-        '''An example of a CronAction method, executed by the take_action method
+                       docker_image_url=None, docker_cmd='bash',
+                       docker_image_digest=None, docker_image_md5sum=None,
+                       stream=False, restart_policy=None, max_restarts=None): 
+        '''An example of a CronAction method, executed by the take_action method.
+           The image is only downloaded and imported if docker_image_name is not
+           present locally with the expected digest (docker_image_digest, or
+           the digest recorded at the last import from docker_image_url).
+           With stream=True the tarball is piped from docker_image_url straight
+           into docker import instead of being staged on scratch_folder.
+           In daemon mode, restart_policy ("always", "on-failure" or "no")
+           and max_restarts let the docker event watcher restart the
+           container as soon as it dies.
+        '''
+
+        if restart_policy is not None:
+            self.supervise_container(docker_name, restart_policy, max_restarts,
+                                     {"scratch_folder" : scratch_folder,
+                                      "docker_name" : docker_name,
+                                      "docker_image_name" : docker_image_name,
+                                      "docker_image_url" : docker_image_url,
+                                      "docker_cmd" : docker_cmd,
+                                      "docker_image_digest" : docker_image_digest,
+                                      "docker_image_md5sum" : docker_image_md5sum,
+                                      "stream" : stream})
+
+        with self.container_lock(docker_name):
+            return self._spin_up_docker(scratch_folder, docker_name, docker_image_name,
+                                        docker_image_url, docker_cmd, docker_image_digest,
+                                        docker_image_md5sum, stream)
+
+
+    def _spin_up_docker(self, scratch_folder, docker_name, docker_image_name,
+                        docker_image_url, docker_cmd, docker_image_digest,
+                        docker_image_md5sum, stream):
+        '''Internal helper method doing the work of spin_up_docker(), called
+           with container_lock(docker_name) held
         '''
 
         if docker_image_url is None:
@@ -117,53 +1699,52 @@ class CronAction(ZtpHelpers):
         if self._check_docker_running(docker_name)["status"]:
             self.syslogger.info("Skip cron action")
             return {"status" : "success", "output" : "Docker container already running"}
+        elif self._start_from_local_image(docker_name, docker_image_name, docker_image_url,
+                                          docker_image_digest, docker_cmd):
+            return {"status" : "success", "output" : "Docker container started from local image"}
         else:       
-            # Download docker container and spin it up
-            docker_download = self.download_file(docker_image_url, destination_folder=scratch_folder)
-
-            if docker_download["status"] == "error":
-                self.syslogger.info("Failed to download docker container tar ball")
-                return {"status" : "error", "output" : "Failed to download docker container tar ball"} 
+            if stream:
+                docker_import = self._docker_import_stream(docker_image_url, docker_image_name,
+                                                           md5sum=docker_image_md5sum)
             else:
-                filename = docker_download["filename"]
-                folder = docker_download["folder"]
-                filepath = os.path.join(folder, filename)
+                # Download docker container and spin it up
+                docker_import = self._download_and_import(docker_image_url, docker_image_name, scratch_folder,
+                                                          md5sum=docker_image_md5sum)
 
-                cmd = "sudo -i docker import " +str(filepath)+ "  " + str(docker_image_name)
-                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-                out, err = process.communicate()
+            if docker_import["status"] == "error":
+                self.syslogger.info("Failed to import docker image")
+                return {"status" : "error", "output" : "Failed to import docker image"} 
+            else:
+                self.update_state("images", docker_image_name, {"url" : docker_image_url,
+                                                                "digest" : docker_import["output"],
+                                                                "timestamp" : time.time()})
 
-                if process.returncode:
-                    self.syslogger.info("Failed to import docker image")
-                    return {"status" : "error", "output" : "Failed to import docker image"} 
-                else:
-                    # Remove the downloaded tar ball
-                    # We don't know why the container died, so remove properly before continuing
-                    try:
-                        cmd = "sudo -i docker rm -f "+str(docker_name)
-                        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-                        out, err = process.communicate()
-                    except:
-                        # Ignoring exception ,for the first launch 
-                        pass 
-
-                    cmd = "sudo -i docker run -itd --privileged -v /var/run/netns:/var/run/netns --name " +str(docker_name) +  " " + str(docker_image_name) + " " + str(docker_cmd) 
-        
-                    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-                    out, err = process.communicate()
+                docker_run = self._docker_run(docker_name, docker_image_name, docker_cmd)
  
-                    if  process.returncode:
-                        self.syslogger.info("Failed to spin up the docker container")
-                        return {"status" : "error", "output" : "Failed to spin up the docker container"}
+                if docker_run["status"] == "error":
+                    self.syslogger.info("Failed to spin up the docker container")
+                    return {"status" : "error", "output" : "Failed to spin up the docker container"}
+                else:
+                    if self._check_docker_running(docker_name)["status"]:
+                        self.syslogger.info("Docker container is now up and running!")
+                        return {"status" : "success", "output" : "Docker container is now up and running!"}
                     else:
-                        if self._check_docker_running(docker_name)["status"]:
-                            self.syslogger.info("Docker container is now up and running!")
-                            return {"status" : "success", "output" : "Docker container is now up and running!"}
+                        self.syslogger.info("Docker container exited right after start")
+                        return {"status" : "error", "output" : "Docker container exited right after start"}
                                 
                   
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay resident and run the cron actions every --interval seconds")
+    parser.add_argument("--interval", type=int, default=60,
+                        help="Tick interval in seconds for --daemon")
+    parser.add_argument("--manifest",
+                        help="Local path or http(s) URL of a JSON manifest of cron methods")
+    args = parser.parse_args()
+
     method1 = {}
     method1["name"] = "spin_up_docker"
     method1["args"] = {"scratch_folder" : "/misc/app_host/scratch",
@@ -171,21 +1752,38 @@ if __name__ == "__main__":
                        "docker_image_name" : "ubuntu",
                        "docker_image_url" : "http://11.11.11.2:9090/ubuntu.tar",
                        "docker_cmd" : "bash"} 
-    method_list = [method1] 
+
+    # Keep the image ready on the standby RP for a fast switchover
+    method2 = {}
+    method2["name"] = "prestage_docker_image"
+    method2["args"] = {"docker_image_name" : "ubuntu",
+                       "docker_image_url" : "http://11.11.11.2:9090/ubuntu.tar"}
+    method2["depends_on"] = ["spin_up_docker"]
+    method2["interval"] = 600
+    method_list = [method1, method2] 
 
     cronobj = CronAction(syslog_server="11.11.11.2", 
                          syslog_port=514, 
                          method_list=method_list)
-    
+
+    if not cronobj.acquire_lock():
+        # Another instance is running. For --daemon, cron only acts as a watchdog
+        if not args.daemon:
+            cronobj.record_tick_metric("skipped")
+        sys.exit(0)
+
     cronobj.set_vrf("mgmt")
-    result = cronobj.is_active_rp()
 
-    if result["status"] == "success":
-        cronobj.syslogger.info("Executing Cron Actions")
-        method_run = cronobj.take_cron_action()
-        if method_run["status"] == "error":
-            cronobj.syslogger.info("Error executing cron methods on active RP: "+str(method_run["output"]))
-        else:
-            cronobj.syslogger.info("Successfully ran the Cron Methods on active RP")
-   
+    if args.manifest is not None:
+        manifest_load = cronobj.load_manifest(args.manifest)
+        if manifest_load["status"] == "error":
+            cronobj.syslogger.info("Failed to load manifest, using the built-in method list")
 
+    if args.daemon:
+        cronobj.run_forever(interval=args.interval)
+    else:
+        run_start = time.time()
+        cronobj.run_once()
+        if time.time() - run_start > CRON_TICK_PERIOD:
+            cronobj.record_tick_metric("overrun")
+            cronobj.save_state()